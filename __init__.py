@@ -22,7 +22,7 @@ from core.llm_client import LLMClient, ConversationCompressor
 from core.agent_loop import AgentLoop, AgentConfig, EventBus
 from core.policy import PolicyEngine, ApprovalMode
 from tools.base import ToolRegistry, ToolScheduler, ToolBuilder, ToolInvocation
-from tools.builtin import register_builtin_tools
+from tools.builtin import register_builtin_tools, get_shared_registry
 from skills.manager import SkillManager, SkillLoader, ActivateSkillTool
 from memory.manager import MemoryManager, ProjectContextExtractor
 
@@ -37,7 +37,7 @@ __all__ = [
     "PolicyEngine", "ApprovalMode",
     # Tools
     "ToolRegistry", "ToolScheduler", "ToolBuilder", "ToolInvocation",
-    "register_builtin_tools",
+    "register_builtin_tools", "get_shared_registry",
     # Skills
     "SkillManager", "SkillLoader", "ActivateSkillTool",
     # Memory
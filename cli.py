@@ -4,40 +4,43 @@ Nano Agent CLI - 命令行界面
 import asyncio
 import os
 import sys
-from typing import Optional
+from typing import TYPE_CHECKING, List, Optional
 
-from rich.console import Console
-from rich.panel import Panel
-from rich.markdown import Markdown
-from rich.syntax import Syntax
-from prompt_toolkit import PromptSession
-from prompt_toolkit.styles import Style
-
-from core.llm_client import LLMClient
-from core.agent_loop import AgentLoop, AgentConfig
+from core.event_loop import install_fast_event_loop
 from core.policy import PolicyEngine, ApprovalMode
 from core.types import EventType
 from skills.manager import SkillManager, ActivateSkillTool
 from memory.manager import MemoryManager, ProjectContextExtractor
 
+if TYPE_CHECKING:
+    from core.agent_loop import AgentLoop
+
 
 # 自定义样式
-style = Style.from_dict({
+STYLE_RULES = {
     'prompt': '#00aa00 bold',
     'hint': '#666666',
-})
+}
 
 
 class NanoClawCLI:
     """Nano Claw命令行界面"""
     
     def __init__(self):
+        # rich / prompt_toolkit 依赖树较大，延迟到真正创建界面时再导入
+        from rich.console import Console
+        from prompt_toolkit import PromptSession
+        from prompt_toolkit.styles import Style
+        
         self.console = Console()
-        self.session = PromptSession(style=style)
-        self.agent: Optional[AgentLoop] = None
+        self.session = PromptSession(style=Style.from_dict(STYLE_RULES))
+        self.agent: Optional["AgentLoop"] = None
         self.skill_manager = SkillManager()
         self.memory_manager: Optional[MemoryManager] = None
         self.project_extractor: Optional[ProjectContextExtractor] = None
+        # 流式输出状态
+        self._live = None
+        self._stream_parts: List[str] = []
     
     def print_banner(self):
         """打印欢迎信息"""
@@ -60,6 +63,9 @@ class NanoClawCLI:
     
     async def setup(self):
         """初始化设置"""
+        from core.llm_client import LLMClient
+        from core.agent_loop import AgentLoop, AgentConfig
+        
         # 检查API密钥
         api_key = os.getenv("OPENAI_API_KEY") or os.getenv("GEMINI_API_KEY")
         if not api_key:
@@ -90,7 +96,7 @@ class NanoClawCLI:
             user_dir=os.path.join(user_home, ".nano_claw", "skills"),
             workspace_dir=os.path.join(".nano_claw", "skills")
         )
-        self.skill_manager.discover_skills()
+        await asyncio.to_thread(self.skill_manager.discover_skills)
         
         # 配置Agent
         config = AgentConfig(
@@ -134,9 +140,36 @@ Be concise but thorough in your responses.""",
     
     async def _on_message(self, event):
         """处理消息事件"""
+        from rich.markdown import Markdown
+        
         data = event.data
-        if data.get("role") == "assistant" and data.get("content"):
-            self.console.print(Markdown(data["content"]))
+        if data.get("role") != "assistant":
+            return
+        
+        # 流式增量：原地刷新渲染
+        if data.get("delta"):
+            if self._live is None:
+                from rich.live import Live
+                self._stream_parts = []
+                self._live = Live(console=self.console, refresh_per_second=12)
+                self._live.start()
+            self._stream_parts.append(data["delta"])
+            self._live.update(Markdown("".join(self._stream_parts)))
+            return
+        
+        if data.get("content"):
+            if self._live is not None:
+                self._live.update(Markdown(data["content"]))
+                self._stop_live()
+            else:
+                self.console.print(Markdown(data["content"]))
+    
+    def _stop_live(self):
+        """结束流式渲染"""
+        if self._live is not None:
+            self._live.stop()
+            self._live = None
+            self._stream_parts = []
     
     async def _on_tool_call(self, event):
         """处理工具调用事件"""
@@ -155,6 +188,8 @@ Be concise but thorough in your responses.""",
     
     async def _on_confirmation_request(self, event):
         """处理确认请求"""
+        from rich.panel import Panel
+        
         details = event.data.get("details", {})
         
         self.console.print(Panel(
@@ -215,8 +250,12 @@ Be concise but thorough in your responses.""",
                 # 运行Agent
                 self.console.print("\n[dim]Assistant thinking...[/dim]\n")
                 
-                async for event in self.agent.run(user_input):
-                    pass  # 事件由事件处理器处理
+                try:
+                    async for event in self.agent.run(user_input):
+                        # 转发到事件总线，由已订阅的处理器渲染
+                        await self.agent.event_bus.emit(event)
+                finally:
+                    self._stop_live()
                 
                 self.console.print()  # 空行分隔
                 
@@ -229,15 +268,16 @@ Be concise but thorough in your responses.""",
     
     async def _handle_command(self, command: str) -> bool:
         """处理命令，返回True表示退出"""
-        parts = command.split()
-        cmd = parts[0].lower()
-        args = parts[1:]
+        head, *rest = command.split(None, 1)
+        cmd = head.lower()
+        args = rest[0].split() if rest else []
         
         if cmd == '/exit' or cmd == '/quit':
             self.console.print("[green]Goodbye![/green]")
             return True
         
         elif cmd == '/help':
+            from rich.markdown import Markdown
             help_text = """
 # Available Commands
 
@@ -292,4 +332,16 @@ async def main():
 
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Nano Claw CLI')
+    parser.add_argument(
+        '--no-uvloop',
+        action='store_true',
+        help='Use the default asyncio event loop (uvloop hides some tracebacks)'
+    )
+    args = parser.parse_args()
+
+    if not args.no_uvloop:
+        install_fast_event_loop()
     asyncio.run(main())
\ No newline at end of file
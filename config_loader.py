@@ -1,25 +1,74 @@
 """
 配置加载器 - 支持YAML配置文件
 """
+import copy
 import os
-import yaml
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from pathlib import Path
 
 
-def load_config(config_path: str = "config.yaml") -> Dict[str, Any]:
-    """加载配置文件"""
+# 合并后的配置缓存：绝对路径 -> (文件签名, 合并结果)
+_CONFIG_CACHE: Dict[str, Tuple[Optional[Tuple[int, int]], Dict[str, Any]]] = {}
+
+
+def _yaml_codec():
+    """
+    延迟导入yaml（命中内存缓存时无需加载），返回(yaml模块, Loader, Dumper)
+    
+    优先使用LibYAML的C实现（PyYAML编译时带libyaml才可用），否则回退纯Python实现
+    """
+    import yaml
+    try:
+        from yaml import CSafeLoader as loader, CSafeDumper as dumper
+    except ImportError:
+        from yaml import SafeLoader as loader, SafeDumper as dumper
+    return yaml, loader, dumper
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """文件签名（mtime_ns, size），文件不存在时为None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _read_user_config(config_path: str) -> Any:
+    """解析配置文件YAML"""
+    yaml, loader, _ = _yaml_codec()
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return yaml.load(f, Loader=loader)
+
+
+def _load_merged_config(config_path: str) -> Dict[str, Any]:
+    """读取并合并默认配置与配置文件（文件未变化时复用缓存）"""
+    key = os.path.abspath(config_path)
+    signature = _file_signature(key)
+    cached = _CONFIG_CACHE.get(key)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    
     config = get_default_config()
+    if signature is not None:
+        user_config = _read_user_config(key)
+        if user_config:
+            # 合并配置
+            config = deep_merge(config, user_config)
+    _resolve_paths(config)
     
-    if os.path.exists(config_path):
-        with open(config_path, 'r', encoding='utf-8') as f:
-            user_config = yaml.safe_load(f)
-            if user_config:
-                # 合并配置
-                config = deep_merge(config, user_config)
+    _CONFIG_CACHE[key] = (signature, config)
+    return config
+
+
+def load_config(config_path: str = "config.yaml") -> Dict[str, Any]:
+    """加载配置文件"""
+    # 返回副本：调用方及下面的后处理都会修改配置
+    config = copy.deepcopy(_load_merged_config(config_path))
 
     # 兼容官方常见 MCP 配置风格：mcpServers（顶层或 mcp 内）
     _normalize_mcp_servers(config)
+    _build_mcp_server_configs(config)
     
     # 从环境变量读取API密钥
     if not config['llm'].get('api_key'):
@@ -28,21 +77,26 @@ def load_config(config_path: str = "config.yaml") -> Dict[str, Any]:
         else:
             config['llm']['api_key'] = os.getenv('GEMINI_API_KEY')
     
-    # 展开路径中的 ~
+    return config
+
+
+def _resolve_paths(config: Dict[str, Any]) -> None:
+    """展开路径中的 ~，并预先算出全局记忆文件路径（结果随合并配置一起缓存）"""
     if config['skills'].get('directories'):
         for key, path in config['skills']['directories'].items():
             if path:
                 config['skills']['directories'][key] = os.path.expanduser(path)
     
-    if config['memory'].get('global_dir'):
-        config['memory']['global_dir'] = os.path.expanduser(config['memory']['global_dir'])
+    global_dir = config['memory'].get('global_dir')
+    if global_dir:
+        global_dir = os.path.expanduser(global_dir)
+        config['memory']['global_dir'] = global_dir
+        config['memory']['global_path'] = os.path.join(global_dir, "memory.md")
 
     if config.get('external_coder', {}).get('working_dir'):
         config['external_coder']['working_dir'] = os.path.expanduser(
             config['external_coder']['working_dir']
         )
-    
-    return config
 
 
 def _normalize_mcp_servers(config: Dict[str, Any]) -> None:
@@ -67,6 +121,23 @@ def _normalize_mcp_servers(config: Dict[str, Any]) -> None:
         mcp_cfg["enabled"] = True
 
 
+def _build_mcp_server_configs(config: Dict[str, Any]) -> None:
+    """
+    启用MCP时，将 mcp.servers 一次性转换为 MCPServerConfig 列表，
+    存入 mcp.server_configs（按配置顺序），各启动路径直接使用
+    """
+    mcp_cfg = config['mcp']
+    servers = mcp_cfg.get('servers')
+    if not mcp_cfg.get('enabled') or not isinstance(servers, dict):
+        return
+    # 延迟导入：未启用MCP时不加载mcp SDK
+    from mcp_client.client import MCPServerConfig
+    mcp_cfg['server_configs'] = [
+        MCPServerConfig.from_dict(name, server_config)
+        for name, server_config in servers.items()
+    ]
+
+
 def get_default_config() -> Dict[str, Any]:
     """获取默认配置"""
     return {
@@ -129,17 +200,31 @@ Be concise but thorough in your responses.''',
 
 
 def deep_merge(base: Dict, update: Dict) -> Dict:
-    """深度合并两个字典"""
-    result = base.copy()
+    """深度合并两个字典（不修改入参）"""
+    result = copy.deepcopy(base)
+    _merge_into(result, update)
+    return result
+
+
+def _merge_into(target: Dict, update: Dict) -> None:
+    """将update原地合并进target"""
     for key, value in update.items():
-        if key in result and isinstance(result[key], dict) and isinstance(value, dict):
-            result[key] = deep_merge(result[key], value)
+        current = target.get(key)
+        if isinstance(current, dict) and isinstance(value, dict):
+            _merge_into(current, value)
         else:
-            result[key] = value
-    return result
+            target[key] = value
 
 
 def save_config(config: Dict[str, Any], config_path: str = "config.yaml") -> None:
     """保存配置到文件"""
+    # server_configs / global_path 由其他配置项派生，不写回文件
+    if 'server_configs' in config.get('mcp', {}):
+        config = dict(config)
+        config['mcp'] = {k: v for k, v in config['mcp'].items() if k != 'server_configs'}
+    if 'global_path' in config.get('memory', {}):
+        config = dict(config)
+        config['memory'] = {k: v for k, v in config['memory'].items() if k != 'global_path'}
+    yaml, _, dumper = _yaml_codec()
     with open(config_path, 'w', encoding='utf-8') as f:
-        yaml.dump(config, f, default_flow_style=False, allow_unicode=True)
+        yaml.dump(config, f, Dumper=dumper, default_flow_style=False, allow_unicode=True)
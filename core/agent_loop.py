@@ -3,19 +3,65 @@ Agent Loop - 核心循环架构
 模仿Gemini CLI的CoderAgentExecutor和AgentLoop
 """
 import asyncio
+import copy
+import hashlib
 import json
+import os
+import time
 import uuid
-from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set
+from collections import OrderedDict, defaultdict
+from typing import Any, AsyncIterator, Callable, DefaultDict, Dict, Final, List, Optional, Set, Tuple
 from dataclasses import dataclass, field
 
 from .types import (
     LoopState, Message, ToolCallRequest, ToolResult, AgentEvent,
-    EventType, EventHandler, ToolSchema
+    EventType, EventHandler, ToolSchema, ConfirmationDetails
 )
 from .llm_client import LLMClient, ConversationCompressor
 from .policy import PolicyEngine, ConfirmationManager, PolicyDecision
-from tools.base import ToolRegistry, ToolScheduler, MUTATOR_KINDS
-from tools.builtin import register_builtin_tools
+from tools.base import ToolScheduler, MUTATOR_KINDS, CACHEABLE_KINDS, PARALLEL_SAFE_KINDS
+from tools.builtin import get_shared_registry
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖
+    orjson = None
+
+# 工具使用说明（静态常量，保证每轮提示词后缀字节一致，便于命中前缀缓存）
+_TOOL_USAGE_GUIDELINES: Final[str] = """
+## Tool Usage Guidelines
+
+You have access to various tools. When you need to use a tool:
+1. Explain your intent before calling the tool
+2. Use the exact tool name and parameters
+3. Wait for the tool result before proceeding
+
+Available tools are provided in the function definitions."""
+
+# TOOL_RESULT 事件中 content_preview 的最大长度
+_RESULT_PREVIEW_CHARS: Final[int] = 200
+
+# 只读工具结果缓存的有效期（秒），兜底覆盖工具之外的外部修改
+_TOOL_CACHE_TTL: Final[float] = 30.0
+
+
+def _safe_json_loads(text: str) -> Any:
+    """解析JSON：优先使用orjson，失败时回退标准库（兼容NaN等非严格JSON）"""
+    if orjson is not None:
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(text)
+
+
+def _canonical(obj: Any) -> Any:
+    """将工具参数递归转换为可哈希的规范形式（dict与键顺序无关）"""
+    if isinstance(obj, dict):
+        return frozenset((k, _canonical(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return tuple(_canonical(x) for x in obj)
+    return obj
 
 
 @dataclass
@@ -25,34 +71,50 @@ class AgentConfig:
     max_turns: int = 100
     temperature: float = 0.7
     enable_compression: bool = True
+    min_turns_before_compression_check: int = 5  # 历史消息数少于该值时跳过压缩检查
     auto_approve_readonly: bool = True
+    enable_prompt_cache: bool = True
+    stream_responses: bool = False  # 逐段推送MESSAGE增量事件（data含delta），需UI支持渲染增量
+    max_parallel_tools: int = 8  # 并发工具调用上限，避免触发下游限流
+    max_parallel_per_group: int = 4  # 同一并发组（如同一MCP服务器）内的并发上限
 
 
 class EventBus:
     """事件总线 - 解耦组件通信"""
     
     def __init__(self):
-        self._handlers: Dict[str, List[EventHandler]] = {}
+        # 以处理器本身为键的有序字典（按订阅顺序），订阅/取消订阅均为O(1)
+        self._handlers: DefaultDict[str, Dict[EventHandler, None]] = defaultdict(dict)
     
     def on(self, event_type: str, handler: EventHandler) -> None:
         """订阅事件"""
-        if event_type not in self._handlers:
-            self._handlers[event_type] = []
-        self._handlers[event_type].append(handler)
+        self._handlers[event_type][handler] = None
     
     def off(self, event_type: str, handler: EventHandler) -> None:
         """取消订阅"""
-        if event_type in self._handlers:
-            self._handlers[event_type].remove(handler)
+        handlers = self._handlers.get(event_type)
+        if handlers is not None:
+            handlers.pop(handler, None)
     
     async def emit(self, event: AgentEvent) -> None:
-        """发布事件"""
-        handlers = self._handlers.get(event.type, [])
-        for handler in handlers:
-            try:
-                await handler(event)
-            except Exception as e:
-                print(f"Error in event handler: {e}")
+        """发布事件（多个订阅者并发执行）"""
+        handlers = self._handlers.get(event.type)
+        if not handlers:
+            return
+        # 快照处理器，避免处理器在执行期间订阅/取消订阅导致的迭代问题
+        handlers = tuple(handlers)
+        if len(handlers) == 1:
+            await self._dispatch(handlers[0], event)
+            return
+        await asyncio.gather(*(self._dispatch(h, event) for h in handlers))
+    
+    @staticmethod
+    async def _dispatch(handler: EventHandler, event: AgentEvent) -> None:
+        """执行单个处理器，异常只打印不向上传播"""
+        try:
+            await handler(event)
+        except Exception as e:
+            print(f"Error in event handler: {e}")
 
 
 class AgentLoop:
@@ -80,7 +142,8 @@ class AgentLoop:
         self.policy = policy_engine or PolicyEngine()
         
         # 组件
-        self.tool_registry = ToolRegistry()
+        # 从共享模板克隆内置工具，避免每个实例重复构建工具与Schema
+        self.tool_registry = get_shared_registry().clone()
         self.tool_scheduler = ToolScheduler(self.tool_registry)
         self.confirmation_manager = ConfirmationManager()
         self.event_bus = EventBus()
@@ -90,17 +153,41 @@ class AgentLoop:
         self.state = LoopState.IDLE
         self.history: List[Message] = []
         self.max_turns = self.config.max_turns
+        self._run_lock: Optional[asyncio.Lock] = None  # 防止同一实例并发运行
+        self._tokenizer_task: Optional[asyncio.Task] = None
         self.current_turn = 0
         
-        # 注册内置工具
-        register_builtin_tools(self.tool_registry)
+        # 只读工具结果缓存（LRU）：条目为 (结果, 过期时间, 文件签名)，
+        # 过期或目标文件的 mtime/大小变化时失效；执行任何不可缓存的工具后整体失效
+        self._tool_cache: "OrderedDict[Tuple[str, Any], Tuple[Any, float, Any]]" = OrderedDict()
+        self._tool_cache_max = 256
+        
+        # 工具并发限流（每次运行时创建，绑定当前事件循环）
+        self._tool_sem: Optional[asyncio.Semaphore] = None
+        self._group_sems: Dict[str, asyncio.Semaphore] = {}
         
         # 额外上下文生成器
         self._context_generators: List[Callable[[], str]] = []
+        self._has_stale_generators = False
+        self._system_prompt_cache: Optional[str] = None
     
-    def add_context_generator(self, generator: Callable[[], str]) -> None:
-        """添加上下文生成器（用于注入Skills、Memory等）"""
+    def add_context_generator(
+        self,
+        generator: Callable[[], str],
+        stale_after_turn: bool = False
+    ) -> None:
+        """
+        添加上下文生成器（用于注入Skills、Memory等）
+        
+        Args:
+            generator: 返回上下文文本的函数
+            stale_after_turn: 输出可能在一次运行的轮次之间变化时设为True，
+                此时系统提示词每轮重建而不是在整次运行内复用
+        """
         self._context_generators.append(generator)
+        if stale_after_turn:
+            self._has_stale_generators = True
+        self._system_prompt_cache = None
     
     def _build_system_prompt(self) -> str:
         """构建完整系统提示词"""
@@ -113,18 +200,21 @@ class AgentLoop:
                 parts.append(context)
         
         # 添加工具使用说明
-        parts.append("""
-## Tool Usage Guidelines
-
-You have access to various tools. When you need to use a tool:
-1. Explain your intent before calling the tool
-2. Use the exact tool name and parameters
-3. Wait for the tool result before proceeding
-
-Available tools are provided in the function definitions.""")
+        parts.append(_TOOL_USAGE_GUIDELINES)
         
         return "\n\n".join(parts)
     
+    @staticmethod
+    def _prompt_cache_key(system_prompt: str) -> str:
+        """以系统提示词内容生成提示词缓存键，相同前缀的请求路由到同一缓存"""
+        return hashlib.blake2b(system_prompt.encode(), digest_size=16).hexdigest()
+    
+    def _get_system_prompt(self) -> str:
+        """获取系统提示词（一次运行内缓存）"""
+        if self._system_prompt_cache is None or self._has_stale_generators:
+            self._system_prompt_cache = self._build_system_prompt()
+        return self._system_prompt_cache
+    
     async def run(self, user_input: str) -> AsyncIterator[AgentEvent]:
         """
         运行Agent循环
@@ -132,23 +222,43 @@ Available tools are provided in the function definitions.""")
         Yields:
             AgentEvent: 各种事件（消息、工具调用、状态变化等）
         """
-        if self.state == LoopState.RUNNING:
+        # 锁在首次运行时创建，绑定到当前事件循环
+        if self._run_lock is None:
+            self._run_lock = asyncio.Lock()
+        
+        # 后台加载分词器，就绪前压缩判断按字符估算
+        if not self.compressor.tokenizer_loaded and (
+            self._tokenizer_task is None or self._tokenizer_task.done()
+        ):
+            self._tokenizer_task = asyncio.create_task(self.compressor.load_tokenizer())
+        
+        if self._run_lock.locked():
             yield AgentEvent(
                 type=EventType.ERROR,
                 data={"error": "Agent is already running"}
             )
             return
         
+        async with self._run_lock:
+            async for event in self._run_locked(user_input):
+                yield event
+    
+    async def _run_locked(self, user_input: str) -> AsyncIterator[AgentEvent]:
+        """在运行锁内执行的Agent循环主体"""
         self.state = LoopState.RUNNING
         yield AgentEvent(type=EventType.STATE_CHANGE, data={"state": "running"})
         
         # 添加用户输入到历史
-        self.history.append(Message(role="user", content=user_input))
+        self._append_history(Message(role="user", content=user_input))
         yield AgentEvent(
             type=EventType.MESSAGE,
             data={"role": "user", "content": user_input}
         )
         
+        # 每次运行开始时重建一次系统提示词，轮次之间复用
+        self._system_prompt_cache = None
+        self._reset_tool_semaphores()
+        
         try:
             agent_turn_active = True
             
@@ -156,15 +266,20 @@ Available tools are provided in the function definitions.""")
                 self.current_turn += 1
                 
                 # 1. 检查是否需要压缩历史
-                if self.config.enable_compression and self.compressor.should_compress(self.history):
+                if (
+                    self.config.enable_compression
+                    and len(self.history) >= self.config.min_turns_before_compression_check
+                    and self.compressor.should_compress(self.history)
+                ):
                     yield AgentEvent(
                         type=EventType.THINKING,
                         data={"message": "Compressing conversation history..."}
                     )
                     self.history = await self.compressor.compress(self.history)
+                    self.compressor.reset(self.history)
                 
                 # 2. 构建系统提示词
-                system_prompt = self._build_system_prompt()
+                system_prompt = self._get_system_prompt()
                 
                 # 3. 获取工具Schema
                 tools = self.tool_registry.get_all_schemas()
@@ -175,12 +290,49 @@ Available tools are provided in the function definitions.""")
                     data={"message": "Thinking..."}
                 )
                 
-                response = await self.llm.generate(
-                    messages=self.history,
-                    tools=tools if tools else None,
-                    system_prompt=system_prompt,
-                    temperature=self.config.temperature
-                )
+                generate_kwargs = {}
+                if self.config.enable_prompt_cache:
+                    generate_kwargs["cache_key"] = self._prompt_cache_key(system_prompt)
+                
+                if self.config.stream_responses:
+                    # 流式生成：文本增量即时推送给UI，工具调用在流结束时给出
+                    content_parts: List[str] = []
+                    stream_tool_calls = None
+                    async for delta in self.llm.stream(
+                        messages=self.history,
+                        tools=tools if tools else None,
+                        system_prompt=system_prompt,
+                        temperature=self.config.temperature,
+                        **generate_kwargs
+                    ):
+                        if delta.content:
+                            content_parts.append(delta.content)
+                            yield AgentEvent(
+                                type=EventType.MESSAGE,
+                                data={"role": "assistant", "delta": delta.content}
+                            )
+                        if delta.tool_calls:
+                            stream_tool_calls = delta.tool_calls
+                    response = Message(
+                        role="assistant",
+                        content="".join(content_parts) or None,
+                        tool_calls=stream_tool_calls
+                    )
+                else:
+                    response = await self.llm.generate(
+                        messages=self.history,
+                        tools=tools if tools else None,
+                        system_prompt=system_prompt,
+                        temperature=self.config.temperature,
+                        **generate_kwargs
+                    )
+                
+                cached_tokens = getattr(self.llm, "last_cached_tokens", 0)
+                if cached_tokens:
+                    yield AgentEvent(
+                        type=EventType.THINKING,
+                        data={"message": f"Prompt cache hit: {cached_tokens}/{self.llm.last_prompt_tokens} tokens"}
+                    )
                 
                 # 5. 处理响应
                 if response.content:
@@ -198,16 +350,16 @@ Available tools are provided in the function definitions.""")
                         tool_requests.append(ToolCallRequest(
                             id=tc.get("id", str(uuid.uuid4())),
                             name=func.get("name", ""),
-                            arguments=json.loads(func.get("arguments", "{}"))
+                            arguments=_safe_json_loads(func.get("arguments") or "{}")
                         ))
                     
                     yield AgentEvent(
                         type=EventType.TOOL_CALL,
-                        data={"calls": [t.__dict__ for t in tool_requests]}
+                        data={"calls": [t.to_dict() for t in tool_requests]}
                     )
                     
                     # 添加助手消息（包含工具调用）到历史
-                    self.history.append(Message(
+                    self._append_history(Message(
                         role="assistant",
                         content=response.content,
                         tool_calls=response.tool_calls
@@ -218,18 +370,24 @@ Available tools are provided in the function definitions.""")
                     
                     # 8. 将结果添加到历史
                     for result in results:
-                        self.history.append(Message(
+                        self._append_history(Message(
                             role="tool",
                             content=result.content if result.success else result.error,
                             tool_call_id=result.call_id
                         ))
                         
+                        content = result.content or ""
                         yield AgentEvent(
                             type=EventType.TOOL_RESULT,
                             data={
                                 "call_id": result.call_id,
                                 "success": result.success,
-                                "content": result.content,
+                                "content": content,
+                                # 在源头截断一次，订阅方无需各自切片大结果
+                                "content_preview": (
+                                    content[:_RESULT_PREVIEW_CHARS]
+                                    if len(content) > _RESULT_PREVIEW_CHARS else content
+                                ),
                                 "error": result.error
                             }
                         )
@@ -241,7 +399,7 @@ Available tools are provided in the function definitions.""")
                 agent_turn_active = False
                 
                 # 添加助手消息到历史
-                self.history.append(Message(
+                self._append_history(Message(
                     role="assistant",
                     content=response.content
                 ))
@@ -272,19 +430,26 @@ Available tools are provided in the function definitions.""")
         self,
         requests: List[ToolCallRequest]
     ) -> List[ToolResult]:
-        """执行工具调用（带确认流程）"""
-        results = []
+        """
+        执行工具调用（带确认流程）
+        
+        按请求顺序执行：相邻的、策略直接允许的幂等调用（读取/搜索/抓取）合并为
+        一批并发执行；其余调用（写入、执行、交互、MCP等）作为顺序屏障，等前面的
+        批次完成后逐个执行。结果顺序与请求顺序一致。
+        """
+        results: List[Optional[ToolResult]] = [None] * len(requests)
+        parallel_batch: List[Tuple[int, Any, Any]] = []
         
-        for request in requests:
+        for index, request in enumerate(requests):
             # 获取工具
             tool = self.tool_registry.get(request.name)
             if not tool:
-                results.append(ToolResult(
+                results[index] = ToolResult(
                     call_id=request.id,
                     success=False,
                     content="",
                     error=f"Tool '{request.name}' not found"
-                ))
+                )
                 continue
             
             # 策略检查
@@ -297,12 +462,12 @@ Available tools are provided in the function definitions.""")
             )
             
             if decision == PolicyDecision.DENY:
-                results.append(ToolResult(
+                results[index] = ToolResult(
                     call_id=request.id,
                     success=False,
                     content="",
                     error=f"Tool '{request.name}' is not allowed by policy"
-                ))
+                )
                 continue
             
             # 创建调用实例
@@ -312,100 +477,182 @@ Available tools are provided in the function definitions.""")
                 request.arguments
             )
             
+            if decision == PolicyDecision.ALLOW and tool.kind in PARALLEL_SAFE_KINDS:
+                parallel_batch.append((index, tool, invocation))
+                continue
+            
+            # 顺序屏障：先完成此前排队的并发批次，保证看到的是之前调用的结果
+            await self._run_parallel_batch(parallel_batch, results)
+            parallel_batch = []
+            
             # 需要确认
             if decision == PolicyDecision.ASK_USER and invocation:
-                details = None
-                if hasattr(invocation, 'get_confirmation_details'):
-                    details = invocation.get_confirmation_details()
-                # 对没有专门确认详情的工具，生成兜底确认信息，避免绕过 ASK_USER。
-                if not details:
-                    affected_locations = []
-                    if hasattr(invocation, 'get_affected_locations'):
-                        try:
-                            affected_locations = invocation.get_affected_locations()
-                        except Exception:
-                            affected_locations = []
-                    details = type("ConfirmationDetailsShim", (), {
-                        "title": f"Confirm tool: {request.name}",
-                        "prompt": self.policy.generate_confirmation_prompt(
-                            request.name,
-                            request.arguments,
-                            affected_locations
-                        ),
-                        "tool_name": request.name,
-                        "arguments": request.arguments,
-                    })()
-                
-                # 发送确认请求事件
-                loop = asyncio.get_running_loop()
-                future = loop.create_future()
-
-                def on_response(approved: bool, outcome: str):
-                    if not future.done():
-                        future.set_result(approved)
-
-                # 先注册，再发事件，避免“瞬时响应”竞态丢失。
-                self.confirmation_manager.request_confirmation(
-                    request.id,
-                    None,
-                    on_response
-                )
-
-                await self.event_bus.emit(AgentEvent(
-                    type=EventType.TOOL_CONFIRMATION_REQUEST,
-                    data={
-                        "call_id": request.id,
-                        "details": {
-                            "title": details.title,
-                            "prompt": details.prompt,
-                            "tool_name": details.tool_name,
-                            "arguments": details.arguments
-                        }
-                    }
-                ))
-                
-                # 等待确认（这里简化处理，实际应该等待用户输入）
-                # 在真实实现中，这会暂停并等待UI层返回确认结果
-                try:
-                    confirmed = await asyncio.wait_for(future, timeout=300)
-                except asyncio.TimeoutError:
-                    confirmed = False
-                
-                if not confirmed:
-                    results.append(ToolResult(
+                if not await self._request_confirmation(request, invocation):
+                    results[index] = ToolResult(
                         call_id=request.id,
                         success=False,
                         content="",
                         error="User cancelled"
-                    ))
+                    )
                     continue
             
-            # 执行工具
-            cancel_event = asyncio.Event()
-            result = await invocation.execute(cancel_event)
-            results.append(result)
+            results[index] = await self._run_invocation(tool, invocation)
         
+        await self._run_parallel_batch(parallel_batch, results)
         return results
     
-    async def _wait_for_confirmation(self, call_id: str) -> bool:
-        """等待用户确认（简化实现）"""
-        # 实际实现中，这会等待UI层的确认响应
-        # 使用asyncio.create_future确保兼容性
-        loop = asyncio.get_running_loop()
-        future = loop.create_future()
+    async def _run_parallel_batch(
+        self,
+        batch: List[Tuple[int, Any, Any]],
+        results: List[Optional[ToolResult]]
+    ) -> None:
+        """并发执行一批幂等调用（受并发上限约束），结果按索引写回"""
+        if not batch:
+            return
+        if len(batch) == 1:
+            index, tool, invocation = batch[0]
+            results[index] = await self._run_invocation(tool, invocation)
+            return
+        if self._tool_sem is None:
+            self._reset_tool_semaphores()
+        batch_results = await asyncio.gather(*(
+            self._run_limited(tool, invocation) for _, tool, invocation in batch
+        ))
+        for (index, _, _), result in zip(batch, batch_results):
+            results[index] = result
+    
+    def _reset_tool_semaphores(self) -> None:
+        """按配置重建并发限流信号量"""
+        self._tool_sem = asyncio.Semaphore(self.config.max_parallel_tools)
+        self._group_sems = {}
+    
+    async def _run_limited(self, tool, invocation) -> ToolResult:
+        """在并发上限内执行工具调用；同组工具先占组内名额，再占全局名额"""
+        group = getattr(tool, "concurrency_group", None)
+        if group is None:
+            async with self._tool_sem:
+                return await self._run_invocation(tool, invocation)
+        
+        group_sem = self._group_sems.get(group)
+        if group_sem is None:
+            group_sem = self._group_sems[group] = asyncio.Semaphore(
+                self.config.max_parallel_per_group
+            )
+        async with group_sem:
+            async with self._tool_sem:
+                return await self._run_invocation(tool, invocation)
+    
+    async def _run_invocation(self, tool, invocation) -> ToolResult:
+        """执行单个工具调用（只读工具命中缓存时直接返回）"""
+        cache_key = None
+        signature = None
+        if tool.kind in CACHEABLE_KINDS:
+            cache_key = self._tool_cache_key(tool.name, invocation.params)
+            if cache_key is not None:
+                signature = self._file_signature(invocation.params)
+                entry = self._tool_cache.get(cache_key)
+                if entry is not None:
+                    cached, expires_at, cached_signature = entry
+                    if time.monotonic() < expires_at and cached_signature == signature:
+                        self._tool_cache.move_to_end(cache_key)
+                        hit = copy.copy(cached)
+                        hit.call_id = invocation.call_id
+                        return hit
+                    del self._tool_cache[cache_key]
+        
+        cancel_event = asyncio.Event()
+        result = await invocation.execute(cancel_event)
+        
+        if cache_key is not None:
+            if result.success:
+                self._tool_cache[cache_key] = (result, time.monotonic() + _TOOL_CACHE_TTL, signature)
+                if len(self._tool_cache) > self._tool_cache_max:
+                    self._tool_cache.popitem(last=False)
+        elif tool.kind not in CACHEABLE_KINDS:
+            # 其他工具（写入、命令、MCP等）可能改变外部状态，缓存整体失效
+            self._tool_cache.clear()
+        return result
+    
+    @staticmethod
+    def _file_signature(params: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+        """目标文件的 (mtime_ns, size)，参数中没有可访问的文件路径时返回None"""
+        path = params.get("path")
+        if not isinstance(path, str) or not path:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+    
+    @staticmethod
+    def _tool_cache_key(name: str, arguments: Dict[str, Any]) -> Optional[Tuple[str, Any]]:
+        """
+        计算工具缓存键（参数无法规范化为可哈希对象时返回None，跳过缓存）
+        
+        键直接使用内置hash，仅在进程内有效（字符串哈希按进程随机化），不可持久化。
+        """
+        try:
+            key = (name, _canonical(arguments))
+            hash(key)
+        except TypeError:
+            return None
+        return key
+    
+    async def _request_confirmation(self, request: ToolCallRequest, invocation) -> bool:
+        """发送确认请求并等待用户响应"""
+        details = None
+        if hasattr(invocation, 'get_confirmation_details'):
+            details = invocation.get_confirmation_details()
+        # 对没有专门确认详情的工具，生成兜底确认信息，避免绕过 ASK_USER。
+        if not details:
+            affected_locations = []
+            if hasattr(invocation, 'get_affected_locations'):
+                try:
+                    affected_locations = invocation.get_affected_locations()
+                except Exception:
+                    affected_locations = []
+            details = ConfirmationDetails(
+                title=f"Confirm tool: {request.name}",
+                prompt=self.policy.generate_confirmation_prompt(
+                    request.name,
+                    request.arguments,
+                    affected_locations
+                ),
+                tool_name=request.name,
+                arguments=request.arguments,
+            )
         
+        # 发送确认请求事件（Future在协程内创建时自动绑定到当前运行的循环）
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+
         def on_response(approved: bool, outcome: str):
             if not future.done():
                 future.set_result(approved)
-        
+
+        # 先注册，再发事件，避免“瞬时响应”竞态丢失。
         self.confirmation_manager.request_confirmation(
-            call_id,
-            None,  # details会在上面发送
+            request.id,
+            None,
             on_response
         )
+
+        await self.event_bus.emit(AgentEvent(
+            type=EventType.TOOL_CONFIRMATION_REQUEST,
+            data={
+                "call_id": request.id,
+                "details": {
+                    "title": details.title,
+                    "prompt": details.prompt,
+                    "tool_name": details.tool_name,
+                    "arguments": details.arguments
+                }
+            }
+        ))
         
+        # 等待确认（这里简化处理，实际应该等待用户输入）
+        # 在真实实现中，这会暂停并等待UI层返回确认结果
         try:
-            # 5分钟超时
             return await asyncio.wait_for(future, timeout=300)
         except asyncio.TimeoutError:
             return False
@@ -414,6 +661,11 @@ Available tools are provided in the function definitions.""")
         """响应对话确认"""
         return self.confirmation_manager.respond(call_id, approved)
     
+    def _append_history(self, message: Message) -> None:
+        """追加历史消息并同步压缩器的累计规模"""
+        self.history.append(message)
+        self.compressor.append(message)
+    
     def get_history(self) -> List[Message]:
         """获取对话历史"""
         return self.history.copy()
@@ -421,6 +673,9 @@ Available tools are provided in the function definitions.""")
     def clear_history(self) -> None:
         """清除对话历史"""
         self.history.clear()
+        self.compressor.reset(self.history)
+        self._tool_cache.clear()
+        self._system_prompt_cache = None
     
     def stop(self) -> None:
         """停止Agent"""
@@ -0,0 +1,17 @@
+"""
+事件循环 - 选择更快的asyncio事件循环实现
+"""
+import asyncio
+import sys
+
+
+def install_fast_event_loop() -> None:
+    """安装更快的事件循环：POSIX 上使用 uvloop（可选依赖），Windows 使用 Proactor"""
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+        return
+    try:
+        import uvloop
+    except ImportError:
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
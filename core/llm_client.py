@@ -2,13 +2,85 @@
 LLM客户端 - 支持OpenAI和Gemini API
 模仿Gemini CLI的GeminiClient
 """
+from __future__ import annotations
+
+import asyncio
+import io
 import os
-from typing import Any, AsyncIterator, Dict, List, Optional, Union
-from openai import AsyncOpenAI
-from openai.types.chat import ChatCompletion, ChatCompletionChunk
-from openai.types.chat.chat_completion_message_param import ChatCompletionMessageParam
+import uuid
+from urllib.parse import urlsplit
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    # openai/httpx 导入开销较大，只在首次创建客户端时导入
+    from openai import AsyncOpenAI
+    from openai.types.chat.chat_completion_message_param import ChatCompletionMessageParam
+
+from .types import Message, ResponseDelta, ToolSchema
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken为可选依赖，缺失时退化为按字符数估算
+    tiktoken = None
+
+
+# 进程内共享的API客户端：(id(事件循环), base_url, api_key) -> (事件循环, AsyncOpenAI)
+# 同一事件循环内的多个LLMClient共享keep-alive连接与TLS会话。连接绑定到创建时的
+# 事件循环，因此按循环分别建池；条目持有循环引用，保证id在条目存活期间不被复用。
+_CLIENT_POOL: Dict[Tuple[Optional[int], Optional[str], Optional[str]], Tuple[Any, AsyncOpenAI]] = {}
+
+
+def _http2_available() -> bool:
+    """httpx的HTTP/2支持依赖可选的h2包"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _get_shared_client(api_key: Optional[str], base_url: Optional[str]) -> AsyncOpenAI:
+    """获取（或创建）当前事件循环内共享的AsyncOpenAI客户端"""
+    loop = _running_loop()
+    key = (id(loop) if loop is not None else None, base_url, api_key)
+    entry = _CLIENT_POOL.get(key)
+    if entry is not None:
+        return entry[1]
+    
+    import httpx
+    from openai import AsyncOpenAI
+    
+    # 顺带清理已关闭循环遗留的条目（其连接已无法使用）
+    for stale in [k for k, (l, _) in _CLIENT_POOL.items() if l is not None and l.is_closed()]:
+        del _CLIENT_POOL[stale]
+    
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+        timeout=httpx.Timeout(600.0, connect=10.0),
+        http2=_http2_available()
+    )
+    client = AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=http_client
+    )
+    _CLIENT_POOL[key] = (loop, client)
+    return client
+
 
-from .types import Message, ToolSchema
+def _is_official_openai(base_url: Optional[str]) -> bool:
+    """是否直连OpenAI官方端点（未指定base_url时SDK默认即为官方端点）"""
+    if not base_url:
+        return True
+    host = urlsplit(base_url).hostname or ""
+    return host == "api.openai.com"
 
 
 class LLMClient:
@@ -19,8 +91,15 @@ class LLMClient:
         api_key: Optional[str] = None,
         base_url: Optional[str] = None,
         model: str = "gpt-4o-mini",
-        provider: str = "openai"
+        provider: str = "openai",
+        openai_extensions: Optional[bool] = None
     ):
+        """
+        Args:
+            openai_extensions: 是否发送OpenAI专有的请求字段（prompt_cache_key等）。
+                为None时仅在provider为openai且直连官方端点时启用；第三方兼容端点
+                可能拒绝未知字段，支持时可显式设为True
+        """
         self.provider = provider
         self.model = model
         self.api_key = api_key or os.getenv("OPENAI_API_KEY") or os.getenv("GEMINI_API_KEY")
@@ -29,48 +108,137 @@ class LLMClient:
         if provider == "gemini":
             base_url = base_url or "https://generativelanguage.googleapis.com/v1beta/openai/"
         
-        self.client = AsyncOpenAI(
-            api_key=self.api_key,
-            base_url=base_url
-        )
+        self.base_url = base_url
+        
+        if openai_extensions is None:
+            openai_extensions = provider == "openai" and _is_official_openai(base_url)
+        self.openai_extensions = openai_extensions
+        
+        # 最近一次请求的提示词Token用量（含命中提供方前缀缓存的部分）
+        self.last_prompt_tokens = 0
+        self.last_cached_tokens = 0
+        
+        # 工具定义转换缓存：(Schema列表, API工具定义)
+        self._tools_cache: Optional[Tuple[List[ToolSchema], List[Dict[str, Any]]]] = None
+        
+        # 消息转换缓存：id(Message) -> (Message, API消息字典)
+        self._message_cache: Dict[int, Tuple[Message, ChatCompletionMessageParam]] = {}
     
-    async def generate(
+    @property
+    def client(self) -> AsyncOpenAI:
+        """当前事件循环内共享的API客户端"""
+        return _get_shared_client(self.api_key, self.base_url)
+    
+    async def aclose(self) -> None:
+        """关闭当前事件循环内与本客户端配置相同的共享连接池（之后再调用会重新创建）"""
+        loop = _running_loop()
+        entry = _CLIENT_POOL.pop((id(loop) if loop is not None else None, self.base_url, self.api_key), None)
+        if entry is not None:
+            await entry[1].close()
+    
+    def _build_messages(
         self,
         messages: List[Message],
-        tools: Optional[List[ToolSchema]] = None,
         system_prompt: Optional[str] = None,
-        temperature: float = 0.7,
-        max_tokens: Optional[int] = None
-    ) -> Message:
-        """生成非流式响应"""
-        # 构建消息列表
+        memoize: bool = True
+    ) -> List[ChatCompletionMessageParam]:
+        """
+        构建API消息列表
+        
+        历史消息创建后不再修改，其转换结果按消息对象缓存；多轮对话中只有
+        新增的消息需要转换，已有前缀复用同一批字典，序列化结果保持字节一致。
+        缓存只保留本次请求的消息，历史被压缩或替换后旧消息随即释放；
+        memoize为False时（压缩等一次性请求）直接转换，不影响对话的缓存。
+        """
         msgs: List[ChatCompletionMessageParam] = []
         
         if system_prompt:
             msgs.append({"role": "system", "content": system_prompt})
         
+        if not memoize:
+            msgs.extend(self._message_to_param(msg) for msg in messages)
+            return msgs
+        
+        cache = self._message_cache
+        current: Dict[int, Tuple[Message, ChatCompletionMessageParam]] = {}
         for msg in messages:
-            msg_dict = msg.to_dict()
-            # 处理工具调用消息
-            if msg.role == "tool":
-                msgs.append({
-                    "role": "tool",
-                    "tool_call_id": msg.tool_call_id or "",
-                    "content": msg.content or ""
-                })
-            elif msg.tool_calls:
-                msgs.append({
-                    "role": "assistant",
-                    "content": msg.content or "",
-                    "tool_calls": msg.tool_calls
-                })
-            else:
-                msgs.append({"role": msg.role, "content": msg.content or ""})
+            # 缓存项持有消息引用，保证id在缓存期间不会被复用
+            entry = cache.get(id(msg))
+            if entry is None or entry[0] is not msg:
+                entry = (msg, self._message_to_param(msg))
+            current[id(msg)] = entry
+            msgs.append(entry[1])
+        self._message_cache = current
+        
+        return msgs
+    
+    @staticmethod
+    def _message_to_param(msg: Message) -> ChatCompletionMessageParam:
+        """将单条消息转换为API格式"""
+        # 处理工具调用消息
+        if msg.role == "tool":
+            return {
+                "role": "tool",
+                "tool_call_id": msg.tool_call_id or "",
+                "content": msg.content or ""
+            }
+        if msg.tool_calls:
+            return {
+                "role": "assistant",
+                "content": msg.content or "",
+                "tool_calls": msg.tool_calls
+            }
+        return {"role": msg.role, "content": msg.content or ""}
+    
+    def _build_tools(self, tools: Optional[List[ToolSchema]]) -> Optional[List[Dict[str, Any]]]:
+        """
+        构建API工具定义
+        
+        工具注册表在变化前返回同一个Schema列表，这里按列表对象缓存上一次的
+        转换结果（持有列表引用，保证身份比较可靠）。
+        """
+        if not tools:
+            return None
+        cached = self._tools_cache
+        if cached is not None and cached[0] is tools and len(cached[1]) == len(tools):
+            return cached[1]
+        openai_tools = [t.as_openai_dict for t in tools]
+        self._tools_cache = (tools, openai_tools)
+        return openai_tools
+    
+    def _record_usage(self, usage: Any) -> None:
+        """记录提示词Token用量与缓存命中数"""
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.last_prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        self.last_cached_tokens = getattr(details, "cached_tokens", 0) or 0
+    
+    async def generate(
+        self,
+        messages: List[Message],
+        tools: Optional[List[ToolSchema]] = None,
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        cache_key: Optional[str] = None,
+        memoize_messages: bool = True
+    ) -> Message:
+        """
+        生成非流式响应
+        
+        Args:
+            cache_key: 提示词前缀缓存键。OpenAI会自动缓存字节一致的提示词前缀，
+                传入相同的键可提高多轮对话命中同一缓存的概率
+            memoize_messages: 是否缓存消息转换结果；一次性请求传False
+        """
+        msgs = self._build_messages(messages, system_prompt, memoize_messages)
         
         # 构建工具定义
-        openai_tools = None
-        if tools:
-            openai_tools = [t.to_dict() for t in tools]
+        openai_tools = self._build_tools(tools)
+        
+        # 提示词缓存路由（仅OpenAI支持，其他兼容端点可能拒绝未知字段）
+        extra_body = None
+        if cache_key and self.openai_extensions:
+            extra_body = {"prompt_cache_key": cache_key}
         
         # 调用API
         response = await self.client.chat.completions.create(
@@ -79,9 +247,13 @@ class LLMClient:
             tools=openai_tools,
             temperature=temperature,
             max_tokens=max_tokens,
-            tool_choice="auto" if tools else None
+            tool_choice="auto" if tools else None,
+            extra_body=extra_body
         )
         
+        # 记录缓存命中情况
+        self._record_usage(getattr(response, "usage", None))
+        
         # 解析响应
         choice = response.choices[0]
         message = choice.message
@@ -107,33 +279,31 @@ class LLMClient:
             tool_calls=tool_calls
         )
     
-    async def generate_stream(
+    async def stream(
         self,
         messages: List[Message],
         tools: Optional[List[ToolSchema]] = None,
         system_prompt: Optional[str] = None,
         temperature: float = 0.7,
-        max_tokens: Optional[int] = None
-    ) -> AsyncIterator[str]:
-        """生成流式响应"""
-        msgs: List[ChatCompletionMessageParam] = []
+        max_tokens: Optional[int] = None,
+        cache_key: Optional[str] = None
+    ) -> AsyncIterator[ResponseDelta]:
+        """
+        生成流式响应（含工具调用）
         
-        if system_prompt:
-            msgs.append({"role": "system", "content": system_prompt})
+        文本增量到达即产出；工具调用的增量片段在客户端拼装，流结束时
+        随最后一个ResponseDelta一次性产出。
+        """
+        msgs = self._build_messages(messages, system_prompt)
         
-        for msg in messages:
-            if msg.role == "tool":
-                msgs.append({
-                    "role": "tool",
-                    "tool_call_id": msg.tool_call_id or "",
-                    "content": msg.content or ""
-                })
-            else:
-                msgs.append({"role": msg.role, "content": msg.content or ""})
+        openai_tools = self._build_tools(tools)
         
-        openai_tools = None
-        if tools:
-            openai_tools = [t.to_dict() for t in tools]
+        extra_kwargs: Dict[str, Any] = {}
+        if self.openai_extensions:
+            # 流式响应默认不带usage，需显式请求才能统计缓存命中
+            extra_kwargs["stream_options"] = {"include_usage": True}
+            if cache_key:
+                extra_kwargs["extra_body"] = {"prompt_cache_key": cache_key}
         
         stream = await self.client.chat.completions.create(
             model=self.model,
@@ -142,19 +312,172 @@ class LLMClient:
             temperature=temperature,
             max_tokens=max_tokens,
             tool_choice="auto" if tools else None,
-            stream=True
+            stream=True,
+            **extra_kwargs
         )
         
+        self._record_usage(None)
+        pending_calls: Dict[int, Dict[str, Any]] = {}
+        call_index_by_id: Dict[str, int] = {}
+        last_index: Optional[int] = None
+        finish_reason = None
+        
         async for chunk in stream:
-            if chunk.choices and chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
+            if getattr(chunk, "usage", None):
+                self._record_usage(chunk.usage)
+            if not chunk.choices:
+                continue
+            
+            choice = chunk.choices[0]
+            delta = choice.delta
+            if delta.content:
+                yield ResponseDelta(content=delta.content)
+            
+            # 按index拼装工具调用片段；缺少index的端点按id归并，
+            # 不带id的后续片段续接到上一个调用
+            for tc in delta.tool_calls or ():
+                index = tc.index
+                if index is None:
+                    if tc.id:
+                        index = call_index_by_id.get(tc.id)
+                        if index is None:
+                            index = max(pending_calls, default=-1) + 1
+                    else:
+                        index = last_index if last_index is not None else 0
+                if tc.id:
+                    call_index_by_id.setdefault(tc.id, index)
+                last_index = index
+                call = pending_calls.setdefault(index, {
+                    "id": "",
+                    "type": "function",
+                    "function": {"name": "", "arguments": ""}
+                })
+                if tc.id:
+                    call["id"] = tc.id
+                if tc.function:
+                    if tc.function.name:
+                        call["function"]["name"] += tc.function.name
+                    if tc.function.arguments:
+                        call["function"]["arguments"] += tc.function.arguments
+            
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+        
+        tool_calls = None
+        if pending_calls:
+            tool_calls = [pending_calls[i] for i in sorted(pending_calls)]
+            for call in tool_calls:
+                if not call["id"]:
+                    call["id"] = f"call_{uuid.uuid4().hex[:24]}"
+        
+        yield ResponseDelta(tool_calls=tool_calls, finish_reason=finish_reason)
     
-    async def compress_history(
+    async def generate_stream(
         self,
         messages: List[Message],
-        prompt: str = "Summarize the conversation history concisely."
-    ) -> str:
-        """压缩历史记录"""
+        tools: Optional[List[ToolSchema]] = None,
+        system_prompt: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: Optional[int] = None,
+        chunk_buffer_bytes: int = 1490,
+        flush_interval_ms: int = 20
+    ) -> AsyncIterator[str]:
+        """
+        生成流式响应（仅文本）
+        
+        逐token的增量先在缓冲区合并，累计达到chunk_buffer_bytes（默认约一个
+        以太网帧）或缓冲内容等待超过flush_interval_ms时产出，减少下游逐token
+        写入的开销。等待下一个增量时同样计时，上游停顿时缓冲内容也会按时输出。
+        chunk_buffer_bytes为0时不缓冲。
+        """
+        msgs = self._build_messages(messages, system_prompt)
+        
+        openai_tools = self._build_tools(tools)
+        
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=msgs,
+            tools=openai_tools,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            tool_choice="auto" if tools else None,
+            stream=True
+        )
+        
+        loop = asyncio.get_running_loop()
+        flush_interval = flush_interval_ms / 1000
+        buf: List[str] = []
+        buf_size = 0
+        flush_at = 0.0  # 缓冲区非空时的输出截止时间
+        
+        chunks = stream.__aiter__()
+        next_chunk: Optional[asyncio.Future] = None
+        try:
+            while True:
+                # 读取下一个增量的任务跨超时保留，超时只触发输出而不丢弃读取
+                if next_chunk is None:
+                    next_chunk = asyncio.ensure_future(chunks.__anext__())
+                timeout = max(flush_at - loop.time(), 0) if buf else None
+                done, _ = await asyncio.wait((next_chunk,), timeout=timeout)
+                if not done:
+                    yield "".join(buf)
+                    buf.clear()
+                    buf_size = 0
+                    continue
+                
+                task, next_chunk = next_chunk, None
+                try:
+                    chunk = task.result()
+                except StopAsyncIteration:
+                    break
+                
+                if not (chunk.choices and chunk.choices[0].delta.content):
+                    continue
+                content = chunk.choices[0].delta.content
+                if not buf:
+                    flush_at = loop.time() + flush_interval
+                buf.append(content)
+                buf_size += len(content.encode("utf-8"))
+                
+                if buf_size >= chunk_buffer_bytes:
+                    yield "".join(buf)
+                    buf.clear()
+                    buf_size = 0
+        finally:
+            if next_chunk is not None:
+                next_chunk.cancel()
+        
+        if buf:
+            yield "".join(buf)
+    
+    async def generate_many(
+        self,
+        batches: List[Tuple[List[Message], Optional[List[ToolSchema]]]],
+        concurrency: int = 20,
+        **kwargs
+    ) -> List[Message]:
+        """
+        并发执行多个独立的非流式请求
+        
+        Args:
+            batches: (消息列表, 工具列表) 组成的请求列表
+            concurrency: 同时进行的最大请求数，用于配合提供方的速率限制
+            **kwargs: 透传给generate的其余参数（temperature等）
+        
+        Returns:
+            与batches顺序一致的响应列表
+        """
+        sem = asyncio.Semaphore(concurrency)
+        
+        async def call(messages: List[Message], tools: Optional[List[ToolSchema]]) -> Message:
+            async with sem:
+                return await self.generate(messages, tools=tools, **kwargs)
+        
+        return await asyncio.gather(*(call(m, t) for m, t in batches))
+    
+    @staticmethod
+    def _build_compression_messages(messages: List[Message], prompt: str) -> List[Message]:
+        """构建压缩请求消息"""
         compression_prompt = f"""You are a conversation compression assistant.
 
 {prompt}
@@ -168,19 +491,76 @@ Please provide a concise summary maintaining:
 Conversation to summarize:
 """
         
-        # 将消息转换为文本
-        conversation = "\n\n".join([
-            f"{msg.role}: {msg.content}" 
-            for msg in messages 
-            if msg.content
-        ])
-        
-        summary_messages = [
-            Message(role="user", content=compression_prompt + conversation)
-        ]
+        # 将消息逐段写入缓冲区，避免中间列表和逐条格式化的临时字符串
+        buf = io.StringIO()
+        buf.write(compression_prompt)
+        sep = ""
+        for msg in messages:
+            if msg.content:
+                buf.write(sep)
+                buf.write(msg.role)
+                buf.write(": ")
+                buf.write(msg.content)
+                sep = "\n\n"
         
-        response = await self.generate(summary_messages, temperature=0.3)
+        return [Message(role="user", content=buf.getvalue())]
+    
+    async def compress_history(
+        self,
+        messages: List[Message],
+        prompt: str = "Summarize the conversation history concisely."
+    ) -> str:
+        """压缩历史记录"""
+        summary_messages = self._build_compression_messages(messages, prompt)
+        response = await self.generate(summary_messages, temperature=0.3, memoize_messages=False)
         return response.content or ""
+    
+    async def compress_history_chunked(
+        self,
+        messages: List[Message],
+        chunk_tokens: int = 64000,
+        concurrency: int = 8,
+        prompt: str = "Summarize the conversation history concisely."
+    ) -> str:
+        """
+        分块压缩超长历史（map-reduce）
+        
+        仅当历史超出单次请求的上下文预算chunk_tokens（按每4个字符约1个token
+        估算）时才分块：各块并发生成摘要，再将各块摘要合并为最终摘要；
+        否则等同于compress_history，只发起一次请求。
+        """
+        chunk_chars = chunk_tokens * 4
+        chunks: List[List[Message]] = [[]]
+        size = 0
+        for msg in messages:
+            length = len(msg.content or "")
+            if chunks[-1] and size + length > chunk_chars:
+                chunks.append([])
+                size = 0
+            chunks[-1].append(msg)
+            size += length
+        
+        if len(chunks) == 1:
+            return await self.compress_history(messages, prompt)
+        
+        partials = await self.generate_many(
+            [(self._build_compression_messages(chunk, prompt), None) for chunk in chunks],
+            concurrency=concurrency,
+            temperature=0.3,
+            memoize_messages=False
+        )
+        
+        # 将各块摘要按时间顺序合并
+        summaries = [
+            Message(role="assistant", content=f"[Part {i}/{len(partials)}]\n{m.content}")
+            for i, m in enumerate(partials, 1)
+            if m.content
+        ]
+        return await self.compress_history(
+            summaries,
+            "Merge these partial summaries of consecutive conversation segments "
+            "into one concise summary."
+        )
 
 
 class ConversationCompressor:
@@ -190,21 +570,106 @@ class ConversationCompressor:
         self,
         llm_client: LLMClient,
         max_messages: int = 50,
-        max_tokens: int = 10000
+        max_tokens: int = 10000,
+        summary_context_tokens: int = 64000
     ):
         self.llm_client = llm_client
         self.max_messages = max_messages
         self.max_tokens = max_tokens
+        # 单次摘要请求可容纳的历史规模，超出时才分块摘要
+        self.summary_context_tokens = summary_context_tokens
+        
+        # 分词器由load_tokenizer在线程中加载，加载完成前按字符估算；False表示不可用
+        self._tokenizer: Any = None
+        # 单条消息Token数缓存：id(Message) -> (Message, token数)
+        self._token_cache: Dict[int, Tuple[Message, int]] = {}
+        
+        # 通过append/extend/reset跟踪的历史规模（增量维护）：
+        # 已编码消息的Token数 + 分词器就绪前记录的消息字符数
+        self._tracking = False
+        self._running_chars = 0
+        self._running_tokens = 0
+    
+    @property
+    def tokenizer_loaded(self) -> bool:
+        """分词器是否已加载完成（含确认不可用的情况）"""
+        return self._tokenizer is not None
+    
+    async def load_tokenizer(self) -> None:
+        """在线程中加载分词器，避免编码文件首次联网下载阻塞事件循环"""
+        if self._tokenizer is None:
+            self._tokenizer = await asyncio.to_thread(self._load_tokenizer)
+    
+    def _load_tokenizer(self) -> Any:
+        """加载与模型匹配的tiktoken编码器，不可用时返回False"""
+        if tiktoken is None:
+            return False
+        model = getattr(self.llm_client, "model", "") or ""
+        try:
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                # 非OpenAI模型（如Gemini）没有对应编码，使用通用编码近似
+                return tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # 编码文件需首次联网下载，失败时退化为字符估算
+            return False
+    
+    def _get_tokenizer(self) -> Any:
+        """获取已加载的编码器，尚未就绪或不可用时返回None"""
+        return self._tokenizer or None
+    
+    def _count_tokens(self, msg: Message, tokenizer: Any) -> int:
+        """计算单条消息的Token数（按消息对象缓存，历史消息只编码一次）"""
+        entry = self._token_cache.get(id(msg))
+        if entry is None or entry[0] is not msg:
+            count = len(tokenizer.encode(msg.content or "", disallowed_special=()))
+            entry = self._token_cache[id(msg)] = (msg, count)
+        return entry[1]
+    
+    def append(self, msg: Message) -> None:
+        """记录新增到历史的消息，累加其规模"""
+        self._tracking = True
+        tokenizer = self._get_tokenizer()
+        if tokenizer is not None:
+            self._running_tokens += self._count_tokens(msg, tokenizer)
+        else:
+            self._running_chars += len(msg.content or "")
+    
+    def extend(self, messages: List[Message]) -> None:
+        """批量记录新增消息"""
+        for msg in messages:
+            self.append(msg)
+    
+    def reset(self, messages: List[Message]) -> None:
+        """历史被整体替换（压缩、清空）后按新历史重新计数"""
+        self._running_chars = 0
+        self._running_tokens = 0
+        self._token_cache = {}
+        self.extend(messages)
     
     def should_compress(self, messages: List[Message]) -> bool:
-        """判断是否需要压缩"""
+        """
+        判断是否需要压缩
+        
+        通过append/extend/reset跟踪历史时直接使用累计值，为O(1)；
+        否则扫描messages估算。
+        """
         # 消息数量检查
         if len(messages) > self.max_messages:
             return True
         
-        # Token数量估算 (简单估算：每4个字符约1个token)
-        total_chars = sum(len(str(m.content or "")) for m in messages)
-        estimated_tokens = total_chars // 4
+        tokenizer = self._get_tokenizer()
+        if self._tracking:
+            estimated_tokens = self._running_tokens + self._running_chars // 4
+        elif tokenizer is not None:
+            estimated_tokens = sum(self._count_tokens(m, tokenizer) for m in messages)
+            if len(self._token_cache) > max(2 * len(messages), 1024):
+                self._token_cache = {id(m): self._token_cache[id(m)] for m in messages}
+        else:
+            # Token数量估算 (简单估算：每4个字符约1个token)
+            total_chars = sum(len(m.content or "") for m in messages)
+            estimated_tokens = total_chars // 4
         
         if estimated_tokens > self.max_tokens:
             return True
@@ -221,8 +686,11 @@ class ConversationCompressor:
         to_compress = messages[:-keep_recent]
         recent = messages[-keep_recent:]
         
-        # 生成摘要
-        summary = await self.llm_client.compress_history(to_compress)
+        # 生成摘要（通常一次请求；超出单次上下文时分块并发摘要后再合并）
+        summary = await self.llm_client.compress_history_chunked(
+            to_compress,
+            chunk_tokens=self.summary_context_tokens
+        )
         
         # 构建压缩后的历史
         compressed = [
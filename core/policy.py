@@ -3,10 +3,10 @@
 模仿Gemini CLI的PolicyEngine
 """
 from enum import Enum
-from typing import Dict, List, Optional, Set
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 from dataclasses import dataclass
 
-from .types import PolicyDecision, ConfirmationDetails
+from .types import PolicyDecision, ConfirmationDetails, _SLOTS
 from tools.base import ToolKind, MUTATOR_KINDS
 
 
@@ -18,7 +18,7 @@ class ApprovalMode(Enum):
     READ_ONLY = "read_only" # 只读模式
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class PolicyRule:
     """策略规则"""
     tool_pattern: str       # 工具名匹配模式
@@ -26,6 +26,40 @@ class PolicyRule:
     condition: Optional[str] = None  # 额外条件
 
 
+# 默认允许的读操作工具
+_READ_TOOLS = frozenset({"read_file", "glob", "grep"})
+
+# Plan模式下允许的工具类型
+_PLAN_ALLOWED_KINDS = frozenset({ToolKind.READ, ToolKind.SEARCH, ToolKind.THINK})
+
+# 基于模式的默认规则
+_DEFAULT_RULES = (
+    PolicyRule("read_*", PolicyDecision.ALLOW),
+    PolicyRule("write_*", PolicyDecision.ASK_USER),
+    PolicyRule("delete_*", PolicyDecision.ASK_USER),
+    PolicyRule("shell", PolicyDecision.ASK_USER),
+    PolicyRule("execute_*", PolicyDecision.ASK_USER),
+)
+
+
+def _split_rules(
+    rules: Iterable[PolicyRule]
+) -> Tuple[Dict[str, PolicyDecision], Tuple[Tuple[str, PolicyDecision], ...]]:
+    """将规则拆分为精确匹配表和前缀规则（按前缀长度降序，最长前缀优先）"""
+    exact: Dict[str, PolicyDecision] = {}
+    prefixes: List[Tuple[str, PolicyDecision]] = []
+    for rule in rules:
+        if rule.tool_pattern.endswith('*'):
+            prefixes.append((rule.tool_pattern[:-1], rule.decision))
+        else:
+            exact.setdefault(rule.tool_pattern, rule.decision)
+    prefixes.sort(key=lambda item: len(item[0]), reverse=True)
+    return exact, tuple(prefixes)
+
+
+_EXACT_RULES, _PREFIX_RULES = _split_rules(_DEFAULT_RULES)
+
+
 class PolicyEngine:
     """策略引擎"""
     
@@ -33,24 +67,16 @@ class PolicyEngine:
         self.mode = mode
         self._always_allow: Set[str] = set()
         self._always_deny: Set[str] = set()
-        self._rules: List[PolicyRule] = []
         self._setup_default_rules()
     
     def _setup_default_rules(self) -> None:
         """设置默认规则"""
         # 读操作工具默认允许
-        self._always_allow.update([
-            "read_file", "glob", "grep"
-        ])
+        self._always_allow.update(_READ_TOOLS)
         
-        # 设置基于模式的规则
-        self._rules = [
-            PolicyRule("read_*", PolicyDecision.ALLOW),
-            PolicyRule("write_*", PolicyDecision.ASK_USER),
-            PolicyRule("delete_*", PolicyDecision.ASK_USER),
-            PolicyRule("shell", PolicyDecision.ASK_USER),
-            PolicyRule("execute_*", PolicyDecision.ASK_USER),
-        ]
+        # 设置基于模式的规则（预先拆分好的查找表为模块级共享）
+        self._exact_rules = _EXACT_RULES
+        self._prefix_rules = _PREFIX_RULES
     
     def set_mode(self, mode: ApprovalMode) -> None:
         """设置批准模式"""
@@ -89,7 +115,7 @@ class PolicyEngine:
         
         # Plan模式 - 只允许读操作和搜索
         if self.mode == ApprovalMode.PLAN:
-            if tool_kind in (ToolKind.READ, ToolKind.SEARCH, ToolKind.THINK):
+            if tool_kind in _PLAN_ALLOWED_KINDS:
                 return PolicyDecision.ALLOW
             return PolicyDecision.ASK_USER
         
@@ -102,9 +128,9 @@ class PolicyEngine:
             return PolicyDecision.ALLOW
         
         # 应用规则
-        for rule in self._rules:
-            if self._match_pattern(tool_name, rule.tool_pattern):
-                return rule.decision
+        decision = self._match_rule(tool_name)
+        if decision is not None:
+            return decision
         
         # 默认：有副作用的操作需要确认
         if is_mutator:
@@ -112,11 +138,15 @@ class PolicyEngine:
         
         return PolicyDecision.ALLOW
     
-    def _match_pattern(self, name: str, pattern: str) -> bool:
-        """匹配工具名模式"""
-        if pattern.endswith('*'):
-            return name.startswith(pattern[:-1])
-        return name == pattern
+    def _match_rule(self, name: str) -> Optional[PolicyDecision]:
+        """按工具名匹配规则：先精确匹配，再按最长前缀匹配"""
+        decision = self._exact_rules.get(name)
+        if decision is not None:
+            return decision
+        for prefix, decision in self._prefix_rules:
+            if name.startswith(prefix):
+                return decision
+        return None
     
     def generate_confirmation_prompt(
         self,
@@ -151,45 +181,45 @@ class PolicyEngine:
         return "\n".join(lines)
 
 
+ConfirmationCallback = Callable[[bool, str], None]
+
+
 class ConfirmationManager:
     """确认管理器"""
     
-    def __init__(self):
-        self._pending_confirmations: Dict[str, ConfirmationDetails] = {}
-        self._callbacks: Dict[str, callable] = {}
+    def __init__(self) -> None:
+        # call_id -> (确认详情, 回调)
+        self._pending: Dict[str, Tuple[Optional[ConfirmationDetails], Optional[ConfirmationCallback]]] = {}
     
     def request_confirmation(
         self,
         call_id: str,
-        details: ConfirmationDetails,
-        callback: callable
+        details: Optional[ConfirmationDetails],
+        callback: Optional[ConfirmationCallback]
     ) -> None:
         """请求确认"""
-        self._pending_confirmations[call_id] = details
-        self._callbacks[call_id] = callback
+        self._pending[call_id] = (details, callback)
     
     def respond(self, call_id: str, approved: bool, outcome: str = "proceed_once") -> bool:
         """响应确认请求"""
-        if call_id not in self._pending_confirmations:
+        entry = self._pending.pop(call_id, None)
+        if entry is None:
             return False
         
-        callback = self._callbacks.get(call_id)
-        if callback:
+        _, callback = entry
+        if callback is not None:
             callback(approved, outcome)
         
-        # 清理
-        del self._pending_confirmations[call_id]
-        del self._callbacks[call_id]
-        
         return True
     
-    def get_pending(self) -> Dict[str, ConfirmationDetails]:
+    def get_pending(self) -> Dict[str, Optional[ConfirmationDetails]]:
         """获取待处理的确认请求"""
-        return self._pending_confirmations.copy()
+        return {call_id: details for call_id, (details, _) in self._pending.items()}
     
     def cancel_all(self) -> None:
         """取消所有待处理的确认"""
-        for call_id, callback in self._callbacks.items():
+        # 先清空再回调，回调中重入时不会看到已取消的请求
+        callbacks = [callback for _, callback in self._pending.values() if callback is not None]
+        self._pending.clear()
+        for callback in callbacks:
             callback(False, "cancel")
-        self._pending_confirmations.clear()
-        self._callbacks.clear()
\ No newline at end of file
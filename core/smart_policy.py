@@ -3,13 +3,112 @@
 """
 import os
 import re
-from typing import Dict, List, Set, Optional
+from typing import Any, Dict, Iterable, List, Set, Optional
 from pathlib import Path
 
 from .policy import PolicyEngine, ApprovalMode, PolicyDecision
 from tools.base import ToolKind
 
 
+def _compile_all(patterns: Iterable[str], flags: int = 0) -> tuple:
+    """预编译一组正则（模块加载时执行一次）"""
+    return tuple(re.compile(p, flags) for p in patterns)
+
+
+def _fuse(*groups: tuple) -> "re.Pattern":
+    """将同一标志的多组正则合并为单个分支正则，一次扫描即可判断是否命中任一模式"""
+    patterns = [p for group in groups for p in group]
+    return re.compile(
+        "|".join(f"(?:{p.pattern})" for p in patterns),
+        patterns[0].flags
+    )
+
+
+# 高风险操作模式
+# 文件操作风险（路径前缀，统一小写后比较）
+_SYSTEM_PATH_PREFIXES = tuple(p.lower() for p in (
+    '/etc/',
+    '/usr/',
+    '/bin/',
+    '/sbin/',
+    'C:\\Windows\\',
+    'C:\\Program Files\\'
+))
+# 危险命令
+_DANGEROUS_COMMAND_PATTERNS = _compile_all([
+    r'rm\s+-rf\s+/',
+    r'del\s+/s\s+/q\s+C:\\',
+    r'format\s+',
+    r'fdisk\s+',
+    r'dd\s+if=.*of=/dev/',
+    r'sudo\s+rm\s+-rf',
+    r'chmod\s+777\s+/',
+    r'chown\s+.*\s+/'
+], re.IGNORECASE)
+# 网络操作
+_NETWORK_OPERATION_PATTERNS = _compile_all([
+    r'curl\s+.*\|\s*sh',
+    r'wget\s+.*\|\s*sh',
+    r'nc\s+-l',
+    r'netcat\s+-l'
+], re.IGNORECASE)
+
+# 安全操作模式
+_READ_OPERATION_PATTERNS = _compile_all([
+    r'cat\s+',
+    r'less\s+',
+    r'head\s+',
+    r'tail\s+',
+    r'grep\s+',
+    r'find\s+',
+    r'ls\s+',
+    r'dir\s+'
+])
+_SAFE_DIRECTORY_PREFIXES = (
+    './',
+    '~/',
+    '/tmp/',
+    '/var/tmp/'
+)
+
+# 中等风险命令：提权与软件安装
+_PRIVILEGED_COMMAND_PATTERNS = _compile_all([r'sudo\s+', r'runas\s+'])
+_PACKAGE_INSTALL_PATTERN = re.compile(r'(apt|yum|brew|pip|npm)\s+(install|uninstall|remove)')
+
+# 热路径使用的合并正则（各模式组的并集）
+_HIGH_RISK_COMMAND_RE = _fuse(_DANGEROUS_COMMAND_PATTERNS, _NETWORK_OPERATION_PATTERNS)
+_READ_OPERATION_RE = _fuse(_READ_OPERATION_PATTERNS)
+_MEDIUM_RISK_COMMAND_RE = _fuse(_PRIVILEGED_COMMAND_PATTERNS, (_PACKAGE_INSTALL_PATTERN,))
+
+# 风险分级使用的名称集合
+_RISKY_GIT_COMMANDS = frozenset({'push', 'reset', 'rebase', 'force-push'})
+_IMPORTANT_FILES = frozenset({
+    'package.json', 'requirements.txt', 'Cargo.toml', 'go.mod',
+    'Dockerfile', 'docker-compose.yml', '.gitignore', 'README.md'
+})
+_LOW_RISK_TOOLS = frozenset({'read_file', 'glob', 'analyze_code', 'analyze_project'})
+_MEDIUM_RISK_KINDS = frozenset({ToolKind.DELETE, ToolKind.EXECUTE})
+
+# RiskAssessment使用的命令模式
+_ASSESS_HIGH_RISK_PATTERNS = _compile_all([
+    r'rm\s+-rf',
+    r'sudo\s+',
+    r'chmod\s+777',
+    r'curl\s+.*\|\s*sh',
+    r'wget\s+.*\|\s*sh'
+], re.IGNORECASE)
+_ASSESS_MEDIUM_RISK_PATTERNS = _compile_all([
+    r'(apt|yum|brew|pip|npm)\s+(install|remove)',
+    r'git\s+(push|reset|rebase)',
+    r'docker\s+(run|exec)'
+], re.IGNORECASE)
+_ASSESS_HIGH_RISK_RE = _fuse(_ASSESS_HIGH_RISK_PATTERNS)
+_ASSESS_MEDIUM_RISK_RE = _fuse(_ASSESS_MEDIUM_RISK_PATTERNS)
+# 上述模式各自必须包含的关键字（小写），用于快速排除无关命令
+_ASSESS_KEYWORDS = ('rm', 'sudo', 'chmod', 'curl', 'wget',
+                    'apt', 'yum', 'brew', 'pip', 'npm', 'git', 'docker')
+
+
 class SmartPolicyEngine(PolicyEngine):
     """智能策略引擎"""
     
@@ -18,56 +117,23 @@ class SmartPolicyEngine(PolicyEngine):
         self._setup_smart_rules()
     
     def _setup_smart_rules(self):
-        """设置智能规则"""
+        """
+        设置智能规则（模式均为模块级常量）
+        
+        路径规则为前缀元组；命令规则保留分组后的原始正则供查看，实际检查
+        使用按组合并后的正则。
+        """
         # 高风险操作模式
         self.high_risk_patterns = {
-            # 文件操作风险
-            'system_files': [
-                r'/etc/.*',
-                r'/usr/.*',
-                r'/bin/.*',
-                r'/sbin/.*',
-                r'C:\\Windows\\.*',
-                r'C:\\Program Files\\.*'
-            ],
-            # 危险命令
-            'dangerous_commands': [
-                r'rm\s+-rf\s+/',
-                r'del\s+/s\s+/q\s+C:\\',
-                r'format\s+',
-                r'fdisk\s+',
-                r'dd\s+if=.*of=/dev/',
-                r'sudo\s+rm\s+-rf',
-                r'chmod\s+777\s+/',
-                r'chown\s+.*\s+/'
-            ],
-            # 网络操作
-            'network_operations': [
-                r'curl\s+.*\|\s*sh',
-                r'wget\s+.*\|\s*sh',
-                r'nc\s+-l',
-                r'netcat\s+-l'
-            ]
+            'system_files': _SYSTEM_PATH_PREFIXES,
+            'dangerous_commands': _DANGEROUS_COMMAND_PATTERNS,
+            'network_operations': _NETWORK_OPERATION_PATTERNS
         }
         
         # 安全操作模式
         self.safe_patterns = {
-            'read_operations': [
-                r'cat\s+',
-                r'less\s+',
-                r'head\s+',
-                r'tail\s+',
-                r'grep\s+',
-                r'find\s+',
-                r'ls\s+',
-                r'dir\s+'
-            ],
-            'safe_directories': [
-                r'./.*',
-                r'~/.*',
-                r'/tmp/.*',
-                r'/var/tmp/.*'
-            ]
+            'read_operations': _READ_OPERATION_PATTERNS,
+            'safe_directories': _SAFE_DIRECTORY_PREFIXES
         }
     
     def check(
@@ -105,27 +171,43 @@ class SmartPolicyEngine(PolicyEngine):
         return base_decision
     
     def _assess_risk(self, tool_name: str, tool_kind: ToolKind, arguments: Dict) -> str:
-        """评估操作风险级别"""
+        """
+        评估操作风险级别
+        
+        与依次调用 _is_high/_is_medium/_is_low_risk_operation 等价，但参数只
+        取值、转字符串一次，按严重程度从高到低检查，命中即返回。
+        """
+        path = str(arguments['path']) if 'path' in arguments else None
+        command = str(arguments['command']) if 'command' in arguments else None
         
         # 高风险操作
-        if self._is_high_risk_operation(tool_name, arguments):
+        if path is not None and path.lower().startswith(_SYSTEM_PATH_PREFIXES):
+            return "high"
+        if command is not None and _HIGH_RISK_COMMAND_RE.search(command):
+            return "high"
+        if tool_name == 'git' and command in _RISKY_GIT_COMMANDS:
             return "high"
         
         # 中等风险操作
-        if self._is_medium_risk_operation(tool_name, arguments):
-            return "medium"
+        if tool_name == 'write_file' and path is not None:
+            if Path(path).name in _IMPORTANT_FILES:
+                return "medium"
+        if tool_name == 'shell' and command is not None:
+            if _MEDIUM_RISK_COMMAND_RE.search(command):
+                return "medium"
         
         # 低风险操作
-        if self._is_low_risk_operation(tool_name, arguments):
+        if tool_name in _LOW_RISK_TOOLS:
+            return "low"
+        if path is not None and path.startswith(_SAFE_DIRECTORY_PREFIXES):
+            return "low"
+        if command is not None and _READ_OPERATION_RE.search(command):
             return "low"
         
         # 默认根据工具类型判断
-        if tool_kind in [ToolKind.DELETE, ToolKind.EXECUTE]:
+        if tool_kind in _MEDIUM_RISK_KINDS:
             return "medium"
-        elif tool_kind in [ToolKind.EDIT, ToolKind.MOVE]:
-            return "low"
-        else:
-            return "low"
+        return "low"
     
     def _is_high_risk_operation(self, tool_name: str, arguments: Dict) -> bool:
         """检查是否为高风险操作"""
@@ -133,24 +215,19 @@ class SmartPolicyEngine(PolicyEngine):
         # 检查文件路径
         if 'path' in arguments:
             path = str(arguments['path'])
-            for pattern in self.high_risk_patterns['system_files']:
-                if re.match(pattern, path, re.IGNORECASE):
-                    return True
+            if path.lower().startswith(_SYSTEM_PATH_PREFIXES):
+                return True
         
         # 检查命令内容
         if 'command' in arguments:
             command = str(arguments['command'])
-            for pattern in self.high_risk_patterns['dangerous_commands']:
-                if re.search(pattern, command, re.IGNORECASE):
-                    return True
-            for pattern in self.high_risk_patterns['network_operations']:
-                if re.search(pattern, command, re.IGNORECASE):
-                    return True
+            if _HIGH_RISK_COMMAND_RE.search(command):
+                return True
         
         # 检查Git操作
         if tool_name == 'git':
-            git_command = arguments.get('command', '')
-            if git_command in ['push', 'reset', 'rebase', 'force-push']:
+            git_command = str(arguments.get('command', ''))
+            if git_command in _RISKY_GIT_COMMANDS:
                 return True
         
         return False
@@ -161,21 +238,14 @@ class SmartPolicyEngine(PolicyEngine):
         # 写入操作到重要目录
         if tool_name == 'write_file' and 'path' in arguments:
             path = Path(arguments['path'])
-            important_files = [
-                'package.json', 'requirements.txt', 'Cargo.toml', 'go.mod',
-                'Dockerfile', 'docker-compose.yml', '.gitignore', 'README.md'
-            ]
-            if path.name in important_files:
+            if path.name in _IMPORTANT_FILES:
                 return True
         
         # Shell命令执行
         if tool_name == 'shell' and 'command' in arguments:
             command = str(arguments['command'])
-            # 包含sudo或管理员权限
-            if re.search(r'sudo\s+', command) or re.search(r'runas\s+', command):
-                return True
-            # 安装或卸载软件
-            if re.search(r'(apt|yum|brew|pip|npm)\s+(install|uninstall|remove)', command):
+            # 包含sudo或管理员权限，或安装/卸载软件
+            if _MEDIUM_RISK_COMMAND_RE.search(command):
                 return True
         
         return False
@@ -184,22 +254,20 @@ class SmartPolicyEngine(PolicyEngine):
         """检查是否为低风险操作"""
         
         # 读取操作
-        if tool_name in ['read_file', 'glob', 'analyze_code', 'analyze_project']:
+        if tool_name in _LOW_RISK_TOOLS:
             return True
         
         # 安全目录的写入操作
         if 'path' in arguments:
             path = str(arguments['path'])
-            for pattern in self.safe_patterns['safe_directories']:
-                if re.match(pattern, path):
-                    return True
+            if path.startswith(_SAFE_DIRECTORY_PREFIXES):
+                return True
         
         # 安全的shell命令
         if 'command' in arguments:
             command = str(arguments['command'])
-            for pattern in self.safe_patterns['read_operations']:
-                if re.search(pattern, command):
-                    return True
+            if _READ_OPERATION_RE.search(command):
+                return True
         
         return False
     
@@ -263,7 +331,7 @@ class RiskAssessment:
         """评估文件操作风险"""
         path_obj = Path(path)
         
-        assessment = {
+        assessment: Dict[str, Any] = {
             "risk_level": "low",
             "factors": [],
             "recommendations": []
@@ -299,41 +367,27 @@ class RiskAssessment:
     @staticmethod
     def assess_command_risk(command: str) -> Dict:
         """评估命令风险"""
-        assessment = {
-            "risk_level": "low",
-            "factors": [],
-            "recommendations": []
-        }
-        
-        # 高风险命令模式
-        high_risk_patterns = [
-            r'rm\s+-rf',
-            r'sudo\s+',
-            r'chmod\s+777',
-            r'curl\s+.*\|\s*sh',
-            r'wget\s+.*\|\s*sh'
-        ]
-        
-        for pattern in high_risk_patterns:
-            if re.search(pattern, command, re.IGNORECASE):
-                assessment["risk_level"] = "high"
-                assessment["factors"].append(f"Dangerous command pattern: {pattern}")
-                assessment["recommendations"].append("Review command carefully")
-                break
+        # 每个模式都包含固定关键字，纯ASCII命令中一个都没出现时不可能命中
+        if command.isascii():
+            lowered = command.lower()
+            if not any(keyword in lowered for keyword in _ASSESS_KEYWORDS):
+                return {"risk_level": "low", "factors": [], "recommendations": []}
+        
+        # 高风险命令模式（合并正则判断是否命中，命中后再按顺序找出具体模式）
+        if _ASSESS_HIGH_RISK_RE.search(command):
+            pattern = next(p for p in _ASSESS_HIGH_RISK_PATTERNS if p.search(command))
+            return {
+                "risk_level": "high",
+                "factors": [f"Dangerous command pattern: {pattern.pattern}"],
+                "recommendations": ["Review command carefully"]
+            }
         
         # 中等风险命令
-        medium_risk_patterns = [
-            r'(apt|yum|brew|pip|npm)\s+(install|remove)',
-            r'git\s+(push|reset|rebase)',
-            r'docker\s+(run|exec)'
-        ]
-        
-        if assessment["risk_level"] != "high":
-            for pattern in medium_risk_patterns:
-                if re.search(pattern, command, re.IGNORECASE):
-                    assessment["risk_level"] = "medium"
-                    assessment["factors"].append(f"System modification command")
-                    assessment["recommendations"].append("Ensure you understand the impact")
-                    break
-        
-        return assessment
\ No newline at end of file
+        if _ASSESS_MEDIUM_RISK_RE.search(command):
+            return {
+                "risk_level": "medium",
+                "factors": ["System modification command"],
+                "recommendations": ["Ensure you understand the impact"]
+            }
+        
+        return {"risk_level": "low", "factors": [], "recommendations": []}
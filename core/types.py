@@ -2,10 +2,15 @@
 核心类型定义 - 模仿Gemini CLI的核心类型系统
 """
 from enum import Enum, auto
-from typing import Any, Callable, Coroutine, Dict, List, Optional, Union
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
 from dataclasses import dataclass, field
 from datetime import datetime
 import json
+import sys
+import time
+
+# dataclass(slots=True) 需要 Python 3.10+，旧版本退化为普通dataclass
+_SLOTS: Dict[str, Any] = {"slots": True} if sys.version_info >= (3, 10) else {}
 
 
 class LoopState(Enum):
@@ -54,7 +59,7 @@ class ToolConfirmationOutcome(Enum):
     MODIFY_WITH_EDITOR = "modify_with_editor"
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class Message:
     """对话消息"""
     role: str  # "user", "assistant", "system", "tool"
@@ -63,6 +68,7 @@ class Message:
     tool_call_id: Optional[str] = None
     name: Optional[str] = None
     timestamp: datetime = field(default_factory=datetime.now)
+    monotonic_ns: int = field(default_factory=time.monotonic_ns, repr=False)  # 单调时钟纳秒，用于排序
     
     def to_dict(self) -> Dict[str, Any]:
         data = {"role": self.role}
@@ -77,7 +83,7 @@ class Message:
         return data
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class ToolCallRequest:
     """工具调用请求"""
     id: str
@@ -91,9 +97,12 @@ class ToolCallRequest:
             name=data.get("name", ""),
             arguments=data.get("arguments", {})
         )
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "name": self.name, "arguments": self.arguments}
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class ToolResult:
     """工具执行结果"""
     call_id: str
@@ -109,12 +118,15 @@ class ToolResult:
         }
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class ToolSchema:
     """工具JSON Schema定义"""
     name: str
     description: str
     parameters: Dict[str, Any]
+    _openai_dict: Optional[Dict[str, Any]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -125,9 +137,24 @@ class ToolSchema:
                 "parameters": self.parameters
             }
         }
+    
+    @property
+    def as_openai_dict(self) -> Dict[str, Any]:
+        """API工具定义（首次访问时生成并缓存，调用方不应修改返回值）"""
+        if self._openai_dict is None:
+            self._openai_dict = self.to_dict()
+        return self._openai_dict
+
+
+@dataclass(**_SLOTS)
+class ResponseDelta:
+    """流式响应增量"""
+    content: Optional[str] = None
+    tool_calls: Optional[List[Dict]] = None  # 完整拼装后的工具调用，仅在流结束时给出
+    finish_reason: Optional[str] = None
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class ConfirmationDetails:
     """确认详情"""
     title: str
@@ -136,7 +163,7 @@ class ConfirmationDetails:
     arguments: Dict[str, Any]
     
 
-@dataclass
+@dataclass(**_SLOTS)
 class SkillDefinition:
     """Skill定义"""
     name: str
@@ -146,14 +173,17 @@ class SkillDefinition:
     disabled: bool = False
     is_builtin: bool = False
     active: bool = False
+    # 技能目录下的资源名快照（加载时采集，None表示未采集）
+    resources: Optional[Tuple[str, ...]] = field(default=None, repr=False)
 
 
-@dataclass
+@dataclass(**_SLOTS)
 class AgentEvent:
     """Agent事件"""
     type: str
     data: Any
     timestamp: datetime = field(default_factory=datetime.now)
+    monotonic_ns: int = field(default_factory=time.monotonic_ns, repr=False)  # 单调时钟纳秒，用于排序
 
 
 # 事件处理器类型
@@ -11,6 +11,7 @@ import asyncio
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from config_loader import load_config
+from core.event_loop import install_fast_event_loop
 from core.llm_client import LLMClient
 from core.agent_loop import AgentLoop, AgentConfig
 from core.policy import PolicyEngine, ApprovalMode
@@ -21,10 +22,14 @@ from memory.manager import MemoryManager
 class NanoAgentDemo:
     """Nano Agent 演示类"""
     
-    def __init__(self):
+    def __init__(self, max_concurrency: int = 2):
         self.agent = None
         self.skill_manager = None
         self.memory_manager = None
+        self.llm_client = None
+        self.agent_config = None
+        # 同时运行的演示数上限（避免触发LLM限流）
+        self.max_concurrency = max_concurrency
     
     async def setup(self):
         """初始化系统"""
@@ -35,7 +40,7 @@ class NanoAgentDemo:
         print(f"✓ Config loaded: {config['llm']['provider']} - {config['llm']['openai']['model']}")
         
         # 创建LLM客户端
-        llm_client = LLMClient(
+        self.llm_client = LLMClient(
             api_key=config['llm']['api_key'],
             provider=config['llm']['provider'],
             model=config['llm']['openai']['model'],
@@ -55,37 +60,84 @@ class NanoAgentDemo:
             user_dir=os.path.expanduser("~/.nano_claw/skills"),
             workspace_dir=".nano_claw/skills"
         )
-        self.skill_manager.discover_skills()
+        await asyncio.to_thread(self.skill_manager.discover_skills)
         skills = self.skill_manager.get_available_skills()
         print(f"✓ Skills system loaded: {len(skills)} skills")
         
         # 创建Agent配置
-        agent_config = AgentConfig(
+        self.agent_config = AgentConfig(
             system_prompt=config['system_prompt'],
             max_turns=config['agent']['max_turns'],
             temperature=config['agent']['temperature']
         )
         
+        self.agent = self._create_agent()
+        
+        print("✓ Agent fully configured\n")
+    
+    def _create_agent(self) -> AgentLoop:
+        """创建一个独立的Agent（各演示互不共享对话历史）"""
         # 创建策略引擎（演示模式使用YOLO）
         policy = PolicyEngine(mode=ApprovalMode.YOLO)
         
-        # 创建Agent
-        self.agent = AgentLoop(
-            llm_client=llm_client,
-            config=agent_config,
+        agent = AgentLoop(
+            llm_client=self.llm_client,
+            config=self.agent_config,
             policy_engine=policy
         )
         
         # 注册上下文生成器
-        self.agent.add_context_generator(self.skill_manager.generate_skills_prompt)
-        self.agent.add_context_generator(self.memory_manager.format_for_system_prompt)
+        agent.add_context_generator(self.skill_manager.generate_skills_prompt)
+        agent.add_context_generator(self.memory_manager.format_for_system_prompt)
         
         # 注册ActivateSkill工具
-        if skills:
-            activate_skill_tool = ActivateSkillTool(self.skill_manager)
-            self.agent.tool_registry.register(activate_skill_tool)
+        if self.skill_manager.get_available_skills():
+            agent.tool_registry.register(ActivateSkillTool(self.skill_manager))
         
-        print("✓ Agent fully configured\n")
+        return agent
+    
+    async def _run_one(self, demo: dict, semaphore: asyncio.Semaphore):
+        """运行单个演示，输出先缓冲，返回(输出行, 对话轮数)"""
+        lines = [
+            f"\n{demo['title']}",
+            f"描述: {demo['description']}",
+            f"输入: {demo['input']}",
+            "-" * 50,
+            "输出:",
+        ]
+        agent = self._create_agent()
+        turns = 0
+        
+        async with semaphore:
+            try:
+                async for event in agent.run(demo['input']):
+                    event_type = event.type
+                    data = event.data
+                    if event_type == EventType.MESSAGE:
+                        if data.get("role") == "assistant":
+                            content = data.get("content")
+                            if content:
+                                lines.append(content)
+                    elif event_type == EventType.TOOL_CALL:
+                        for call in data.get("calls", ()):
+                            lines.append(f"🔧 调用工具: {call['name']}")
+                    elif event_type == EventType.TOOL_RESULT:
+                        if data.get("success"):
+                            lines.append("✓ 工具执行成功")
+                        else:
+                            lines.append(f"❌ 工具执行失败: {data.get('error')}")
+                    elif event_type == EventType.ERROR:
+                        lines.append(f"❌ 错误: {data.get('error')}")
+                    elif event_type == EventType.COMPLETION:
+                        turns = data.get("turns", 0)
+                
+                lines.append("\n✓ 演示完成")
+                
+            except Exception as e:
+                lines.append(f"❌ 演示出错: {e}")
+        
+        lines.append("=" * 60)
+        return lines, turns
     
     async def run_demo(self):
         """运行演示"""
@@ -116,47 +168,23 @@ class NanoAgentDemo:
             }
         ]
         
-        for demo in demos:
-            print(f"\n{demo['title']}")
-            print(f"描述: {demo['description']}")
-            print(f"输入: {demo['input']}")
-            print("-" * 50)
-            print("输出:")
-            
-            try:
-                async for event in self.agent.run(demo['input']):
-                    if event.type == EventType.MESSAGE and event.data.get("role") == "assistant":
-                        content = event.data.get("content", "")
-                        if content:
-                            print(content)
-                    elif event.type == EventType.TOOL_CALL:
-                        calls = event.data.get("calls", [])
-                        for call in calls:
-                            print(f"🔧 调用工具: {call['name']}")
-                    elif event.type == EventType.TOOL_RESULT:
-                        success = event.data.get("success")
-                        if success:
-                            print("✓ 工具执行成功")
-                        else:
-                            print(f"❌ 工具执行失败: {event.data.get('error')}")
-                    elif event.type == EventType.ERROR:
-                        print(f"❌ 错误: {event.data.get('error')}")
-                
-                print("\n✓ 演示完成")
-                
-            except Exception as e:
-                print(f"❌ 演示出错: {e}")
-            
-            print("=" * 60)
+        # 各演示互不依赖，并发运行；输出按原顺序打印
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        outcomes = await asyncio.gather(*(self._run_one(demo, semaphore) for demo in demos))
+        
+        total_turns = 0
+        for lines, turns in outcomes:
+            print("\n".join(lines))
+            total_turns += turns
         
         print("\n🎉 所有演示完成！")
         print("\n📊 系统统计:")
         print(f"  - 可用工具: {len(self.agent.tool_registry.get_all())} 个")
         print(f"  - 可用技能: {len(self.skill_manager.get_available_skills())} 个")
-        print(f"  - 对话轮数: {self.agent.current_turn} 轮")
+        print(f"  - 对话轮数: {total_turns} 轮")
         
         # 检查是否创建了演示文件
-        if os.path.exists("demo_output.txt"):
+        if await asyncio.to_thread(os.path.exists, "demo_output.txt"):
             print("  - 文件操作: ✓ 成功创建演示文件")
         else:
             print("  - 文件操作: ❌ 未创建演示文件")
@@ -168,4 +196,5 @@ async def main():
     await demo.run_demo()
 
 if __name__ == "__main__":
+    install_fast_event_loop()
     asyncio.run(main())
\ No newline at end of file
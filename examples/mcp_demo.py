@@ -4,27 +4,34 @@ MCP 功能演示
 展示如何使用 Nano Agent 的 MCP 集成
 """
 import asyncio
-import yaml
+import os
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
 
-from mcp_client.client import MCPManager, MCPServerConfig
+from config_loader import load_config
+from core.event_loop import install_fast_event_loop
+from mcp_client.client import MCPManager
 
 console = Console()
 
 
+def _truncate(text: str, width: int) -> str:
+    """超过width个字符时截断并加省略号"""
+    if len(text) <= width:
+        return text
+    return text[:width] + "..."
+
+
 async def demo_mcp():
     """演示 MCP 功能"""
     console.print(Panel.fit("🔗 Nano Agent MCP 演示", style="bold blue"))
     
-    # 读取配置
-    try:
-        with open('config.yaml', 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
-    except FileNotFoundError:
+    # 读取配置（与主程序共用 load_config 的解析缓存）
+    if not os.path.exists('config.yaml'):
         console.print("[red]错误: 找不到 config.yaml 文件[/red]")
         return
+    config = load_config('config.yaml')
     
     if not config.get('mcp', {}).get('enabled', False):
         console.print("[yellow]MCP 未启用，请在 config.yaml 中启用 MCP[/yellow]")
@@ -37,23 +44,17 @@ async def demo_mcp():
         servers = config['mcp']['servers']
         console.print(f"\n📡 正在连接 {len(servers)} 个 MCP 服务器...")
         
+        mcp_configs = config['mcp'].get('server_configs', [])
+        # 并发连接，总耗时取决于最慢的服务器
+        results = await manager.add_servers(mcp_configs)
+        
         connected_servers = []
-        for server_name, server_config in servers.items():
-            console.print(f"  连接 {server_name}...", end="")
-            
-            mcp_config = MCPServerConfig(
-                name=server_name,
-                command=server_config.get('command'),
-                args=server_config.get('args', []),
-                env=server_config.get('env', {})
-            )
-            
-            success = await manager.add_server(mcp_config)
+        for mcp_config, success in zip(mcp_configs, results):
             if success:
-                console.print(" [green]✓[/green]")
-                connected_servers.append(server_name)
+                console.print(f"  连接 {mcp_config.name}... [green]✓[/green]")
+                connected_servers.append(mcp_config.name)
             else:
-                console.print(" [red]✗[/red]")
+                console.print(f"  连接 {mcp_config.name}... [red]✗[/red]")
         
         if not connected_servers:
             console.print("[red]没有成功连接任何 MCP 服务器[/red]")
@@ -72,11 +73,13 @@ async def demo_mcp():
             table.add_column("工具名", style="green")
             table.add_column("描述", style="white")
             
-            for adapter in adapters:
-                server_name = adapter.server_name
-                tool_name = adapter.mcp_tool['name']
-                description = adapter.description[:50] + "..." if len(adapter.description) > 50 else adapter.description
-                table.add_row(server_name, tool_name, description)
+            # 先整理好行数据，再一次性填入表格
+            rows = [
+                (adapter.server_name, adapter.mcp_tool['name'], _truncate(adapter.description or "", 50))
+                for adapter in adapters
+            ]
+            for row in rows:
+                table.add_row(*row)
             
             console.print(table)
         else:
@@ -85,12 +88,8 @@ async def demo_mcp():
         # 显示连接的服务器信息
         console.print(f"\n📊 服务器详情:")
         for name, connection in manager.connections.items():
-            tools_count = len(connection.get_tools())
-            resources_count = len(connection.get_resources())
-            prompts_count = len(connection.get_prompts())
-            
             info_panel = Panel(
-                f"工具: {tools_count} | 资源: {resources_count} | 提示: {prompts_count}",
+                f"工具: {connection.tool_count} | 资源: {connection.resource_count} | 提示: {connection.prompt_count}",
                 title=f"[bold]{name}[/bold]",
                 border_style="green"
             )
@@ -108,4 +107,5 @@ async def demo_mcp():
 
 
 if __name__ == "__main__":
+    install_fast_event_loop()
     asyncio.run(demo_mcp())
@@ -8,6 +8,7 @@ import os
 # 添加父目录到路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from core.event_loop import install_fast_event_loop
 from core.llm_client import LLMClient
 from core.agent_loop import AgentLoop, AgentConfig
 from core.policy import PolicyEngine, ApprovalMode
@@ -65,7 +66,7 @@ When using tools, explain your intent first.""",
     def on_tool_result(event):
         data = event.data
         if data.get("success"):
-            print(f"\n✅ Tool result: {data['content'][:200]}...")
+            print(f"\n✅ Tool result: {data.get('content_preview', '')}...")
         else:
             print(f"\n❌ Tool error: {data.get('error')}")
     
@@ -92,4 +93,5 @@ When using tools, explain your intent first.""",
 
 
 if __name__ == "__main__":
+    install_fast_event_loop()
     asyncio.run(main())
\ No newline at end of file
@@ -5,44 +5,88 @@ import asyncio
 import os
 import sys
 from pathlib import Path
+from typing import Any, List
 
 # 添加当前目录到路径
 sys.path.insert(0, str(Path(__file__).parent))
 
-from rich.console import Console
-from rich.panel import Panel
-from rich.markdown import Markdown
-from rich.table import Table
-from prompt_toolkit import PromptSession
-from prompt_toolkit.styles import Style
-
 from config_loader import load_config
-from core.llm_client import LLMClient
-from core.agent_loop import AgentLoop, AgentConfig
+from core.event_loop import install_fast_event_loop
 from core.policy import PolicyEngine, ApprovalMode
 from core.types import EventType
 from skills.manager import SkillManager, ActivateSkillTool
 from memory.manager import MemoryManager
-from mcp_client.client import MCPManager, MCPServerConfig
 from tools.external_coder import ExternalCoderSettings, ExternalCoderTool
 
 
-console = Console()
-prompt_style = Style.from_dict({
+# 批准模式名称映射（配置文件与 /mode 命令共用）
+_MODE_MAP = {
+    'plan': ApprovalMode.PLAN,
+    'default': ApprovalMode.DEFAULT,
+    'yolo': ApprovalMode.YOLO,
+    'read_only': ApprovalMode.READ_ONLY
+}
+
+# 提示符样式
+PROMPT_STYLE_RULES = {
     "prompt": "#00aa00 bold",
-})
+}
+
+HELP_TEXT = """
+# Available Commands
+
+- `/exit`, `/quit` - Exit the application
+- `/help` - Show this help message
+- `/skills` - List available skills
+- `/clear` - Clear conversation history
+- `/mode <plan|default|yolo|read_only>` - Change approval mode
+- `/config` - Show current configuration
+- `/mcp` - Show MCP server status and tools
+"""
+
+_help_md = None
+
+
+def _help_markdown():
+    """帮助信息的Markdown渲染对象（首次使用时解析并缓存）"""
+    global _help_md
+    if _help_md is None:
+        from rich.markdown import Markdown
+        _help_md = Markdown(HELP_TEXT)
+    return _help_md
 
 
 class NanoAgentApp:
     """Nano Agent 应用程序"""
     
-    def __init__(self, config_path: str = "config.yaml"):
+    def __init__(self, config_path: str = "config.yaml", batch_output: bool = True):
+        # rich / prompt_toolkit 依赖树较大，延迟到真正创建界面时再导入
+        from rich.console import Console
+        from prompt_toolkit import PromptSession
+        from prompt_toolkit.styles import Style
+        
         self.config = load_config(config_path)
+        self.console = Console()
+        self._banner = self._build_banner()
         self.agent = None
         self.skill_manager = None
         self.memory_manager = None
         self.mcp_manager = None
-        self.prompt_session = PromptSession(style=prompt_style)
+        # 批量输出：事件渲染内容按逻辑轮次合并为一次console.print
+        self.batch_output = batch_output
+        self._pending_output: List[Any] = []
+        # 命令名 -> 处理协程（返回True表示退出）
+        self._commands = {
+            '/exit': self._cmd_exit,
+            '/quit': self._cmd_exit,
+            '/help': self._cmd_help,
+            '/skills': self._cmd_skills,
+            '/clear': self._cmd_clear,
+            '/mode': self._cmd_mode,
+            '/config': self._cmd_config,
+            '/mcp': self._cmd_mcp,
+        }
+        self.prompt_session = PromptSession(style=Style.from_dict(PROMPT_STYLE_RULES))
 
     def _generate_coding_routing_prompt(self) -> str:
         """为编程任务注入路由约束，优先使用外部编程代理。"""
@@ -55,12 +99,12 @@ For software implementation tasks:
 4. If user does not specify path, default file outputs to current working directory.
 """
     
-    def print_banner(self):
-        """打印欢迎信息"""
+    def _build_banner(self) -> str:
+        """生成欢迎信息（依赖配置，构造时生成一次）"""
         provider = self.config['llm']['provider']
         model = self.config['llm'][provider]['model']
         
-        banner = f"""
+        return f"""
 ╭────────────────────────────────────────────────────────────╮
 │                                                            │
 │   🤖 Nano Claw - Python Agent System                      │
@@ -75,17 +119,23 @@ For software implementation tasks:
 │                                                            │
 ╰────────────────────────────────────────────────────────────╯
         """
-        console.print(banner, style="cyan")
+    
+    def print_banner(self):
+        """打印欢迎信息"""
+        self.console.print(self._banner, style="cyan")
     
     async def setup(self):
         """初始化设置"""
+        from core.llm_client import LLMClient
+        from core.agent_loop import AgentLoop, AgentConfig
+        
         # 检查API密钥
         api_key = self.config['llm'].get('api_key')
         if not api_key:
-            console.print("[red]Error: API key not found![/red]")
-            console.print("\nPlease set one of the following:")
-            console.print("  1. Environment variable: OPENAI_API_KEY or GEMINI_API_KEY")
-            console.print("  2. Add api_key to config.yaml")
+            self.console.print("[red]Error: API key not found![/red]")
+            self.console.print("\nPlease set one of the following:")
+            self.console.print("  1. Environment variable: OPENAI_API_KEY or GEMINI_API_KEY")
+            self.console.print("  2. Add api_key to config.yaml")
             return False
         
         # 创建 LLM 客户端
@@ -96,37 +146,16 @@ For software implementation tasks:
             api_key=api_key,
             provider=provider,
             model=provider_config['model'],
-            base_url=provider_config.get('base_url')
+            base_url=provider_config.get('base_url'),
+            openai_extensions=provider_config.get('openai_extensions')
         )
         
-        # 设置记忆系统
-        if self.config['memory']['enabled']:
-            global_dir = self.config['memory'].get('global_dir', '~/.nano_claw')
-            self.memory_manager = MemoryManager()
-            self.memory_manager.global_memory_path = Path(global_dir).expanduser() / "memory.md"
-            await self.memory_manager.refresh()
-        
-        # 设置Skills
-        if self.config['skills']['enabled']:
-            dirs = self.config['skills']['directories']
-            self.skill_manager = SkillManager()
-            self.skill_manager.set_directories(
-                builtin_dir=dirs.get('builtin'),
-                user_dir=dirs.get('user'),
-                workspace_dir=dirs.get('workspace')
-            )
-            self.skill_manager.discover_skills()
-        
-        # 设置MCP
-        if self.config['mcp']['enabled']:
-            self.mcp_manager = MCPManager()
-            for server_name, server_config in self.config['mcp']['servers'].items():
-                mcp_config = MCPServerConfig.from_dict(server_name, server_config)
-                success = await self.mcp_manager.add_server(mcp_config)
-                if success:
-                    console.print(f"[green]✓ MCP server connected: {server_name}[/green]")
-                else:
-                    console.print(f"[red]✗ MCP server failed: {server_name}[/red]")
+        # 记忆、Skills、MCP 互不依赖，并发初始化；Agent 的构建依赖三者，放在之后
+        await asyncio.gather(
+            self._setup_memory(),
+            self._setup_skills(),
+            self._setup_mcp()
+        )
         
         # 配置Agent
         agent_config = AgentConfig(
@@ -138,13 +167,7 @@ For software implementation tasks:
         )
         
         # 设置批准模式
-        mode_map = {
-            'plan': ApprovalMode.PLAN,
-            'default': ApprovalMode.DEFAULT,
-            'yolo': ApprovalMode.YOLO,
-            'read_only': ApprovalMode.READ_ONLY
-        }
-        approval_mode = mode_map.get(
+        approval_mode = _MODE_MAP.get(
             self.config['agent']['approval_mode'],
             ApprovalMode.DEFAULT
         )
@@ -194,36 +217,107 @@ For software implementation tasks:
         
         return True
     
+    async def _setup_memory(self):
+        """设置记忆系统"""
+        if not self.config['memory']['enabled']:
+            return
+        self.memory_manager = MemoryManager()
+        global_path = self.config['memory'].get('global_path')
+        if global_path:
+            self.memory_manager.global_memory_path = Path(global_path)
+        await self.memory_manager.refresh()
+    
+    async def _setup_skills(self):
+        """设置Skills"""
+        if not self.config['skills']['enabled']:
+            return
+        dirs = self.config['skills']['directories']
+        self.skill_manager = SkillManager()
+        self.skill_manager.set_directories(
+            builtin_dir=dirs.get('builtin'),
+            user_dir=dirs.get('user'),
+            workspace_dir=dirs.get('workspace')
+        )
+        # 目录扫描是阻塞IO，放到线程中，避免卡住并发进行的MCP握手
+        await asyncio.to_thread(self.skill_manager.discover_skills)
+    
+    async def _setup_mcp(self):
+        """设置MCP"""
+        if not self.config['mcp']['enabled']:
+            return
+        # 未启用MCP时不加载mcp SDK
+        from mcp_client.client import MCPManager
+        
+        self.mcp_manager = MCPManager()
+        mcp_configs = self.config['mcp'].get('server_configs', [])
+        # 各服务器的启动与握手互不依赖，并发进行
+        results = await self.mcp_manager.add_servers(mcp_configs)
+        for mcp_config, success in zip(mcp_configs, results):
+            if success:
+                self.console.print(f"[green]✓ MCP server connected: {mcp_config.name}[/green]")
+            else:
+                self.console.print(f"[red]✗ MCP server failed: {mcp_config.name}[/red]")
+    
     async def _on_message(self, event):
+        from rich.markdown import Markdown
+        
         data = event.data
         if data.get("role") == "assistant" and data.get("content"):
-            console.print(Markdown(data["content"]))
+            self._write(Markdown(data["content"]))
+            self._flush_output()
     
     async def _on_tool_call(self, event):
-        calls = event.data.get("calls", [])
-        for call in calls:
-            console.print(f"[dim]🔧 Calling: {call['name']}[/dim]")
+        for call in event.data.get("calls", ()):
+            self._write(f"[dim]🔧 Calling: {call['name']}[/dim]")
+        # 接下来要等待工具执行，先把本批调用输出
+        self._flush_output()
     
     async def _on_tool_result(self, event):
         data = event.data
         if not data.get("success"):
-            console.print(f"[red]Error: {data.get('error')}[/red]")
+            self._write(f"[red]Tool error: {data.get('error')}[/red]")
+        # 一次工具结果是一个逻辑边界
+        self._flush_output()
     
     async def _on_error(self, event):
-        console.print(f"[red]Error: {event.data.get('error')}[/red]")
+        self._write(f"[red]Error: {event.data.get('error')}[/red]")
+        # 错误立即显示，不等到本轮结束
+        self._flush_output()
     
     async def _on_thinking(self, event):
-        if event.data.get("message"):
-            console.print(f"[dim]{event.data['message']}[/dim]")
+        message = event.data.get("message")
+        if message:
+            self._write(f"[dim]{message}[/dim]")
+            # 进度提示之后通常是耗时的LLM调用，需立即显示
+            self._flush_output()
+    
+    def _write(self, renderable):
+        """输出事件渲染内容：批量模式下先缓冲，到逻辑边界统一刷新"""
+        if self.batch_output:
+            self._pending_output.append(renderable)
+        else:
+            self.console.print(renderable)
+    
+    def _flush_output(self):
+        """将缓冲的渲染内容合并为一次输出"""
+        if not self._pending_output:
+            return
+        from rich.console import Group
+        pending, self._pending_output = self._pending_output, []
+        self.console.print(Group(*pending))
 
     async def _on_confirmation_request(self, event):
         """处理工具确认请求"""
+        from rich.panel import Panel
+        
         details = event.data.get("details", {})
         title = details.get("title", "Confirmation Required")
         prompt = details.get("prompt", "Do you want to proceed?")
         call_id = event.data.get("call_id")
 
-        console.print(Panel(prompt, title=title, border_style="yellow"))
+        # 提示用户前先输出已缓冲的内容
+        self._flush_output()
+        self.console.print(Panel(prompt, title=title, border_style="yellow"))
         response = await self.prompt_session.prompt_async("Proceed? [y/N]: ", style="class:prompt")
         approved = response.strip().lower() in ("y", "yes")
         self.agent.respond_to_confirmation(call_id, approved)
@@ -239,18 +333,18 @@ For software implementation tasks:
         # 显示加载状态
         if self.skill_manager:
             skills = self.skill_manager.get_available_skills()
-            console.print(f"[green]✓ {len(skills)} skills loaded[/green]")
+            self.console.print(f"[green]✓ {len(skills)} skills loaded[/green]")
         
         if self.memory_manager:
             memory = self.memory_manager.get_environment_memory()
             if memory:
-                console.print(f"[green]✓ Project context loaded[/green]")
+                self.console.print(f"[green]✓ Project context loaded[/green]")
         
-        console.print("\n[dim]Type /help for commands, /exit to quit[/dim]\n")
+        self.console.print("\n[dim]Type /help for commands, /exit to quit[/dim]\n")
         
         while True:
             try:
-                # 使用简单的input代替prompt_toolkit
+                # prompt_toolkit 异步读取输入，等待期间事件循环仍可处理MCP等后台任务
                 user_input = await self.prompt_session.prompt_async("You: ", style="class:prompt")
                 user_input = user_input.strip()
                 
@@ -263,150 +357,161 @@ For software implementation tasks:
                     continue
                 
                 # 运行Agent
-                console.print("\n[dim]Assistant thinking...[/dim]\n")
+                self.console.print("\n[dim]Assistant thinking...[/dim]\n")
                 
-                async for event in self.agent.run(user_input):
-                    # 处理事件（这里之前被忽略了！）
-                    if event.type == EventType.MESSAGE and event.data.get("role") == "assistant":
-                        content = event.data.get("content", "")
-                        if content:
-                            console.print(content)
-                    elif event.type == EventType.TOOL_CALL:
-                        calls = event.data.get("calls", [])
-                        for call in calls:
-                            console.print(f"[dim]🔧 Calling: {call['name']}[/dim]")
-                    elif event.type == EventType.TOOL_RESULT:
-                        success = event.data.get("success")
-                        if not success:
-                            console.print(f"[red]Tool error: {event.data.get('error')}[/red]")
-                    elif event.type == EventType.ERROR:
-                        console.print(f"[red]Error: {event.data.get('error')}[/red]")
+                event_bus = self.agent.event_bus
+                try:
+                    async for event in self.agent.run(user_input):
+                        # 转发到事件总线，由 setup 中订阅的处理器渲染
+                        await event_bus.emit(event)
+                finally:
+                    self._flush_output()
                 
-                console.print()
+                self.console.print()
                 
             except KeyboardInterrupt:
-                console.print("\n[green]Goodbye! 👋[/green]")
+                self.console.print("\n[green]Goodbye! 👋[/green]")
                 break
             except EOFError:
                 break
             except Exception as e:
-                console.print(f"[red]Error: {e}[/red]")
+                self.console.print(f"[red]Error: {e}[/red]")
     
     async def _handle_command(self, command: str) -> bool:
-        """处理命令"""
-        parts = command.split()
-        cmd = parts[0].lower()
-        args = parts[1:]
-        
-        if cmd in ('/exit', '/quit'):
-            # 清理 MCP 连接
-            if hasattr(self, 'mcp_manager') and self.mcp_manager:
-                await self.mcp_manager.disconnect_all()
-            console.print("[green]Goodbye! 👋[/green]")
-            return True
-        
-        elif cmd == '/help':
-            help_text = """
-# Available Commands
-
-- `/exit`, `/quit` - Exit the application
-- `/help` - Show this help message
-- `/skills` - List available skills
-- `/clear` - Clear conversation history
-- `/mode <plan|default|yolo|read_only>` - Change approval mode
-- `/config` - Show current configuration
-- `/mcp` - Show MCP server status and tools
-            """
-            console.print(Markdown(help_text))
-        
-        elif cmd == '/skills':
-            if self.skill_manager:
-                skills = self.skill_manager.get_available_skills()
-                if skills:
-                    console.print("[bold]Available Skills:[/bold]")
-                    for skill in skills:
-                        status = "🟢" if skill.active else "⚪"
-                        console.print(f"{status} {skill.name}: {skill.description[:60]}...")
-                else:
-                    console.print("[yellow]No skills available[/yellow]")
-        
-        elif cmd == '/clear':
-            self.agent.clear_history()
-            console.print("[green]Conversation history cleared[/green]")
-        
-        elif cmd == '/mode' and args:
-            mode_map = {
-                'plan': ApprovalMode.PLAN,
-                'default': ApprovalMode.DEFAULT,
-                'yolo': ApprovalMode.YOLO,
-                'read_only': ApprovalMode.READ_ONLY
-            }
-            mode = mode_map.get(args[0].lower())
-            if mode:
-                self.agent.policy.set_mode(mode)
-                console.print(f"[green]Mode changed to: {args[0]}[/green]")
-        
-        elif cmd == '/config':
-            console.print("[bold]Current Configuration:[/bold]")
-            console.print(f"  LLM Provider: {self.config['llm']['provider']}")
-            console.print(f"  Model: {self.config['llm'][self.config['llm']['provider']]['model']}")
-            console.print(f"  Approval Mode: {self.config['agent']['approval_mode']}")
-            console.print(f"  Max Turns: {self.config['agent']['max_turns']}")
-            console.print(f"  Temperature: {self.config['agent']['temperature']}")
-            
-            # 显示 MCP 状态
-            if self.config.get('mcp', {}).get('enabled', False):
-                mcp_servers = len(self.config['mcp'].get('servers', {}))
-                connected_servers = len(self.mcp_manager.connections) if hasattr(self, 'mcp_manager') and self.mcp_manager else 0
-                console.print(f"  MCP: Enabled ({connected_servers}/{mcp_servers} servers connected)")
-            else:
-                console.print(f"  MCP: Disabled")
-        
-        elif cmd == '/mcp':
-            if not self.config.get('mcp', {}).get('enabled', False):
-                console.print("[yellow]MCP is not enabled in configuration[/yellow]")
-            elif not hasattr(self, 'mcp_manager') or not self.mcp_manager:
-                console.print("[yellow]MCP manager not initialized[/yellow]")
+        """处理命令，返回True表示退出"""
+        # 只切出命令名，参数部分按需再拆分
+        head, *rest = command.split(None, 1)
+        cmd = head.lower()
+        handler = self._commands.get(cmd)
+        if handler is None:
+            self.console.print(f"[red]Unknown command: {cmd}[/red]")
+            return False
+        return bool(await handler(rest[0].split() if rest else []))
+    
+    async def _cmd_exit(self, args) -> bool:
+        """/exit, /quit"""
+        # 清理 MCP 连接
+        if self.mcp_manager:
+            await self.mcp_manager.disconnect_all()
+        if self.memory_manager:
+            self.memory_manager.close()
+        if self.agent:
+            await self.agent.llm.aclose()
+        self.console.print("[green]Goodbye! 👋[/green]")
+        return True
+    
+    async def _cmd_help(self, args) -> None:
+        """/help"""
+        self.console.print(_help_markdown())
+    
+    async def _cmd_skills(self, args) -> None:
+        """/skills"""
+        if self.skill_manager:
+            skills = self.skill_manager.get_available_skills()
+            if skills:
+                self.console.print("[bold]Available Skills:[/bold]")
+                for skill in skills:
+                    status = "🟢" if skill.active else "⚪"
+                    self.console.print(f"{status} {skill.name}: {skill.description[:60]}...")
             else:
-                console.print("[bold]MCP Status:[/bold]")
-                
-                # 显示连接的服务器
-                if self.mcp_manager.connections:
-                    console.print(f"\n[green]Connected Servers ({len(self.mcp_manager.connections)}):[/green]")
-                    for name, connection in self.mcp_manager.connections.items():
-                        tools_count = len(connection.get_tools())
-                        resources_count = len(connection.get_resources())
-                        prompts_count = len(connection.get_prompts())
-                        console.print(f"  • {name}: {tools_count} tools, {resources_count} resources, {prompts_count} prompts")
-                else:
-                    console.print("[yellow]No MCP servers connected[/yellow]")
-                
-                # 显示可用工具
-                adapters = self.mcp_manager.get_adapters()
-                if adapters:
-                    console.print(f"\n[green]Available MCP Tools ({len(adapters)}):[/green]")
-                    for adapter in adapters[:10]:  # 只显示前10个
-                        console.print(f"  • {adapter.display_name}")
-                    if len(adapters) > 10:
-                        console.print(f"  ... and {len(adapters) - 10} more")
+                self.console.print("[yellow]No skills available[/yellow]")
+    
+    async def _cmd_clear(self, args) -> None:
+        """/clear"""
+        self.agent.clear_history()
+        self.console.print("[green]Conversation history cleared[/green]")
+    
+    async def _cmd_mode(self, args) -> None:
+        """/mode <name>"""
+        if not args:
+            self.console.print("[red]Unknown command: /mode[/red]")
+            return
+        mode = _MODE_MAP.get(args[0].lower())
+        if mode:
+            self.agent.policy.set_mode(mode)
+            self.console.print(f"[green]Mode changed to: {args[0]}[/green]")
+    
+    async def _cmd_config(self, args) -> None:
+        """/config"""
+        self.console.print("[bold]Current Configuration:[/bold]")
+        self.console.print(f"  LLM Provider: {self.config['llm']['provider']}")
+        self.console.print(f"  Model: {self.config['llm'][self.config['llm']['provider']]['model']}")
+        self.console.print(f"  Approval Mode: {self.config['agent']['approval_mode']}")
+        self.console.print(f"  Max Turns: {self.config['agent']['max_turns']}")
+        self.console.print(f"  Temperature: {self.config['agent']['temperature']}")
         
+        # 显示 MCP 状态
+        mcp_cfg = self.config.get('mcp', {})
+        if mcp_cfg.get('enabled', False):
+            mcp_servers = len(mcp_cfg.get('servers', {}))
+            connected_servers = len(self.mcp_manager.connections) if self.mcp_manager else 0
+            self.console.print(f"  MCP: Enabled ({connected_servers}/{mcp_servers} servers connected)")
         else:
-            console.print(f"[red]Unknown command: {cmd}[/red]")
-        
-        return False
+            self.console.print(f"  MCP: Disabled")
+    
+    async def _cmd_mcp(self, args) -> None:
+        """/mcp"""
+        if not self.config.get('mcp', {}).get('enabled', False):
+            self.console.print("[yellow]MCP is not enabled in configuration[/yellow]")
+        elif not self.mcp_manager:
+            self.console.print("[yellow]MCP manager not initialized[/yellow]")
+        else:
+            self.console.print("[bold]MCP Status:[/bold]")
+            
+            # 显示连接的服务器
+            connections = self.mcp_manager.connections
+            if connections:
+                self.console.print(f"\n[green]Connected Servers ({len(connections)}):[/green]")
+                for name, connection in connections.items():
+                    self.console.print(
+                        f"  • {name}: {connection.tool_count} tools, "
+                        f"{connection.resource_count} resources, {connection.prompt_count} prompts"
+                    )
+            else:
+                self.console.print("[yellow]No MCP servers connected[/yellow]")
+            
+            # 显示可用工具
+            adapters = self.mcp_manager.get_adapters()
+            adapter_count = len(adapters)
+            if adapter_count:
+                self.console.print(f"\n[green]Available MCP Tools ({adapter_count}):[/green]")
+                for adapter in adapters[:10]:  # 只显示前10个
+                    self.console.print(f"  • {adapter.display_name}")
+                if adapter_count > 10:
+                    self.console.print(f"  ... and {adapter_count - 10} more")
 
 
-async def main():
-    """主入口"""
+def parse_args():
+    """解析命令行参数"""
     import argparse
     
     parser = argparse.ArgumentParser(description='Nano Claw - Python Agent System')
     parser.add_argument('-c', '--config', default='config.yaml', help='Config file path')
-    args = parser.parse_args()
+    parser.add_argument(
+        '--no-uvloop',
+        action='store_true',
+        help='Use the default asyncio event loop (uvloop hides some tracebacks)'
+    )
+    parser.add_argument(
+        '--no-batch',
+        action='store_true',
+        help='Print each event immediately instead of batching output per turn (debugging)'
+    )
+    return parser.parse_args()
+
+
+async def main(args=None):
+    """主入口"""
+    if args is None:
+        args = parse_args()
     
-    app = NanoAgentApp(config_path=args.config)
+    app = NanoAgentApp(config_path=args.config, batch_output=not args.no_batch)
     await app.run_interactive()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    # 事件循环策略需在 asyncio.run 之前设置
+    if not args.no_uvloop:
+        install_fast_event_loop()
+    asyncio.run(main(args))
@@ -3,44 +3,285 @@ MCP (Model Context Protocol) 客户端
 使用官方 mcp 库实现
 """
 import asyncio
+import functools
+import hashlib
+import inspect
+import io
+import json
 import logging
 import os
-from typing import Any, Dict, List, Optional
-from dataclasses import dataclass
-from contextlib import AsyncExitStack
+import shutil
+import signal
+import time
+from collections.abc import Sequence
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from dataclasses import dataclass, field
+from contextlib import AsyncExitStack, contextmanager
 
+import httpx
+import mcp.client.stdio as _mcp_stdio
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 from mcp.client.sse import sse_client
 from mcp.client.streamable_http import streamablehttp_client
+from mcp.types import ImageContent, TextContent
 
+from core.types import _SLOTS
 from tools.base import ToolBuilder, ToolInvocation, ToolKind, ToolResult
 
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+def _dumps(obj: Any) -> bytes:
+    """按键排序序列化为JSON字节串：优先使用orjson，无法处理的对象回退标准库"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=str, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            pass
+    return json.dumps(obj, sort_keys=True, default=str).encode("utf-8")
+
+
+def _loads(data: bytes) -> Any:
+    """解析JSON字节串"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# 单个连接同时进行中的工具调用上限：stdio 会话本身串行处理，远程传输可放宽
+# 可通过环境变量 MCP_MAX_INFLIGHT 统一覆盖
+_DEFAULT_MAX_INFLIGHT_STDIO = 8
+_DEFAULT_MAX_INFLIGHT_REMOTE = 32
+
+
+def _max_inflight(transport: str) -> int:
+    """单个连接的工具调用并发上限"""
+    override = os.getenv("MCP_MAX_INFLIGHT")
+    if override:
+        try:
+            return max(1, int(override))
+        except ValueError:
+            logger.warning(f"Invalid MCP_MAX_INFLIGHT value: {override!r}")
+    if (transport or "stdio").lower() == "stdio":
+        return _DEFAULT_MAX_INFLIGHT_STDIO
+    return _DEFAULT_MAX_INFLIGHT_REMOTE
+
+
+# 断开连接时关闭传输层的最长等待（秒），避免卡住的子进程拖住整体退出
+_DISCONNECT_TIMEOUT = 5.0
+
+
+async def _close_exit_stack(exit_stack: AsyncExitStack, timeout: float) -> None:
+    """
+    限时关闭exit stack
+    
+    SDK基于anyio，cancel scope必须在进入它的任务中退出，因此优先使用
+    asyncio.timeout（3.11+）在当前任务内计时；旧版本退回wait_for。
+    """
+    if hasattr(asyncio, "timeout"):
+        async with asyncio.timeout(timeout):
+            await exit_stack.aclose()
+    else:
+        await asyncio.wait_for(exit_stack.aclose(), timeout)
+
+
+def _is_unknown_tool_error(message: str) -> bool:
+    """工具调用错误是否表示服务器上不存在该工具"""
+    message = message.lower()
+    return "unknown tool" in message or ("tool" in message and "not found" in message)
+
+
+# stdio_client 启动的子进程：SDK不对外暴露进程对象，仅在 connect() 进入 stdio_client 期间
+# 临时替换SDK内部的进程创建函数并通过上下文变量收集，以便关闭超时时直接结束子进程
+_spawned_processes: ContextVar[Optional[List[Any]]] = ContextVar("_spawned_processes", default=None)
+_sdk_create_process: Optional[Callable[..., Any]] = None
+_process_hook_depth = 0
+_process_hook_warned = False
+
+
+async def _create_process_tracked(*args, **kwargs):
+    process = await _sdk_create_process(*args, **kwargs)
+    sink = _spawned_processes.get()
+    if sink is not None:
+        sink.append(process)
+    return process
+
+
+@contextmanager
+def _track_spawned_processes(sink: List[Any]):
+    """在作用域内收集 stdio_client 创建的子进程；并发连接共享同一次替换，最后一个退出时恢复"""
+    global _sdk_create_process, _process_hook_depth, _process_hook_warned
+    
+    if _process_hook_depth == 0:
+        original = getattr(_mcp_stdio, "_create_platform_compatible_process", None)
+        if original is None:
+            if not _process_hook_warned:
+                _process_hook_warned = True
+                logger.warning(
+                    "mcp.client.stdio 缺少 _create_platform_compatible_process，"
+                    "断开超时时无法强制结束stdio子进程"
+                )
+            yield
+            return
+        _sdk_create_process = original
+        _mcp_stdio._create_platform_compatible_process = _create_process_tracked
+    
+    _process_hook_depth += 1
+    token = _spawned_processes.set(sink)
+    try:
+        yield
+    finally:
+        _spawned_processes.reset(token)
+        _process_hook_depth -= 1
+        if _process_hook_depth == 0:
+            _mcp_stdio._create_platform_compatible_process = _sdk_create_process
+            _sdk_create_process = None
+
+
+def _kill_process(process: Any) -> None:
+    """强制结束子进程；SDK在POSIX上以新会话启动子进程，优先结束整个进程组"""
+    pid = getattr(process, "pid", None)
+    if pid is None:
+        return
+    try:
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(pid, signal.SIGKILL)
+                return
+            except ProcessLookupError:
+                pass
+        process.kill()
+    except (ProcessLookupError, OSError):
+        pass
+
+
+# 远程MCP服务器共享的HTTP连接池（进程内所有远程连接复用TCP/TLS连接）
+_shared_http_transport: Optional[httpx.AsyncHTTPTransport] = None
+
+
+def _http2_available() -> bool:
+    """httpx的HTTP/2支持依赖可选的h2包"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class _SharedHTTPTransport(httpx.AsyncBaseTransport):
+    """共享连接池的传输层包装：SDK关闭各会话的客户端时不关闭底层连接池"""
+    
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport.handle_async_request(request)
+    
+    async def aclose(self) -> None:
+        pass
+
+
+def _create_pooled_http_client(
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Optional[httpx.Timeout] = None,
+    auth: Optional[httpx.Auth] = None,
+) -> httpx.AsyncClient:
+    """SDK的 httpx_client_factory：每个会话独立的客户端，共享同一连接池"""
+    global _shared_http_transport
+    if _shared_http_transport is None:
+        _shared_http_transport = httpx.AsyncHTTPTransport(
+            http2=_http2_available(),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+        )
+    return httpx.AsyncClient(
+        headers=headers,
+        timeout=timeout if timeout is not None else httpx.Timeout(30.0, read=300.0),
+        auth=auth,
+        follow_redirects=True,
+        transport=_SharedHTTPTransport(_shared_http_transport)
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _accepts_client_factory(client_fn) -> bool:
+    """该版本SDK的传输函数是否支持 httpx_client_factory 参数"""
+    try:
+        return "httpx_client_factory" in inspect.signature(client_fn).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def _pooled_client_kwargs(client_fn) -> Dict[str, Any]:
+    """支持时注入共享连接池的客户端工厂"""
+    if _accepts_client_factory(client_fn):
+        return {"httpx_client_factory": _create_pooled_http_client}
+    return {}
+
+
+def _resolve_string(value: str) -> str:
+    """解析字符串中的环境变量占位符，例如 ${TOKEN}。"""
+    return os.path.expandvars(value)
 
-@dataclass
+
+def _resolve_dict(data: Dict[str, Any]) -> Dict[str, Any]:
+    """解析字典中的字符串环境变量（返回新字典）。"""
+    return {
+        key: _resolve_string(value) if isinstance(value, str) else value
+        for key, value in (data or {}).items()
+    }
+
+
+def _resolve_env(env: Dict[str, str]) -> Dict[str, str]:
+    """解析 env 值中的变量引用。"""
+    return {k: _resolve_string(str(v)) for k, v in (env or {}).items()}
+
+
+# 能力发现结果的磁盘缓存目录
+DISCOVERY_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "nano-claw",
+    "mcp_discovery"
+)
+
+
+@dataclass(frozen=True, **_SLOTS)
 class MCPServerConfig:
-    """MCP服务器配置"""
+    """MCP服务器配置（不可变，可哈希；env/headers不参与哈希）"""
     name: str
     command: Optional[str] = None
-    args: List[str] = None
-    env: Dict[str, str] = None
+    args: Tuple[str, ...] = ()
+    env: Dict[str, str] = field(default_factory=dict, hash=False)
     transport: str = "stdio"
     url: Optional[str] = None
-    headers: Dict[str, str] = None
+    headers: Dict[str, str] = field(default_factory=dict, hash=False)
     timeout: float = 30.0
     sse_read_timeout: float = 300.0
+    # 能力发现结果磁盘缓存的有效期（秒），默认0表示不缓存
+    discovery_cache_ttl: float = 0.0
+    # 构造时解析好环境变量占位符的值，connect/重连直接复用（不参与比较，repr中隐藏以免泄露密钥）
+    resolved_env: Dict[str, str] = field(default=None, init=False, hash=False, compare=False, repr=False)
+    resolved_url: Optional[str] = field(default=None, init=False, compare=False, repr=False)
+    resolved_headers: Dict[str, Any] = field(default=None, init=False, hash=False, compare=False, repr=False)
     
     def __post_init__(self):
-        if self.args is None:
-            self.args = []
+        # 兼容直接传入list/None的调用方：规范化为不可变、可哈希的形式
+        if not isinstance(self.args, tuple):
+            object.__setattr__(self, "args", tuple(self.args or ()))
         if self.env is None:
-            self.env = {}
+            object.__setattr__(self, "env", {})
         if self.headers is None:
-            self.headers = {}
+            object.__setattr__(self, "headers", {})
         if self.url and not self.transport:
-            self.transport = "streamable_http"
+            object.__setattr__(self, "transport", "streamable_http")
+        object.__setattr__(self, "resolved_env", _resolve_env(self.env))
+        object.__setattr__(self, "resolved_url", _resolve_string(self.url) if self.url else self.url)
+        object.__setattr__(self, "resolved_headers", _resolve_dict(self.headers))
 
     @classmethod
     def from_dict(cls, name: str, config: Dict[str, Any]) -> "MCPServerConfig":
@@ -58,27 +299,40 @@ class MCPServerConfig:
         return cls(
             name=name,
             command=config.get("command"),
-            args=config.get("args", []),
-            env=config.get("env", {}),
+            args=tuple(config.get("args") or ()),
+            env=config.get("env") or {},
             transport=transport,
             url=config.get("url"),
-            headers=config.get("headers", {}),
+            headers=config.get("headers") or {},
             timeout=float(config.get("timeout", 30)),
             sse_read_timeout=float(config.get("sse_read_timeout", 300)),
+            discovery_cache_ttl=float(config.get("discovery_cache_ttl", 0)),
         )
 
 
 class MCPConnection:
     """MCP连接 - 使用官方SDK"""
     
+    __slots__ = (
+        "config", "session", "exit_stack", "_tools", "_resources", "_prompts",
+        "_connected", "_call_sem", "_read_only_tools", "_inflight", "_process",
+    )
+    
     def __init__(self, config: MCPServerConfig):
         self.config = config
         self.session: Optional[ClientSession] = None
         self.exit_stack = AsyncExitStack()
+        self._process: Any = None  # stdio 传输的子进程（可获取时）
         self._tools: List[Dict] = []
         self._resources: List[Dict] = []
         self._prompts: List[Dict] = []
         self._connected = False
+        # 限制同时进行中的工具调用，避免在同一会话上堆积大量等待中的请求
+        self._call_sem = asyncio.Semaphore(_max_inflight(config.transport))
+        # 只读工具：相同参数的并发调用合并为一次请求（结果缓存由AgentLoop负责）；
+        # 调用其他工具前后不再合并此前发出的请求
+        self._read_only_tools: frozenset = frozenset()
+        self._inflight: Dict[Tuple[str, bytes], asyncio.Future] = {}
     
     async def connect(self) -> bool:
         """建立连接"""
@@ -93,20 +347,24 @@ class MCPConnection:
                 # 创建服务器参数
                 server_params = StdioServerParameters(
                     command=self.config.command,
-                    args=self.config.args,
-                    env=self._resolve_env(self.config.env)
-                )
-                read, write = await self.exit_stack.enter_async_context(
-                    stdio_client(server_params)
+                    args=list(self.config.args),
+                    env=self.config.resolved_env
                 )
+                processes: List[Any] = []
+                with _track_spawned_processes(processes):
+                    read, write = await self.exit_stack.enter_async_context(
+                        stdio_client(server_params)
+                    )
+                self._process = processes[0] if processes else None
             elif transport == "streamable_http":
                 if not self.config.url:
                     raise ValueError(f"MCP server '{self.config.name}' missing required field: url")
                 client_ctx = streamablehttp_client(
-                    url=self._resolve_string(self.config.url),
-                    headers=self._resolve_dict(self.config.headers) or None,
+                    url=self.config.resolved_url,
+                    headers=self.config.resolved_headers or None,
                     timeout=self.config.timeout,
                     sse_read_timeout=self.config.sse_read_timeout,
+                    **_pooled_client_kwargs(streamablehttp_client)
                 )
                 read, write, _ = await self.exit_stack.enter_async_context(client_ctx)
             elif transport == "sse":
@@ -114,10 +372,11 @@ class MCPConnection:
                     raise ValueError(f"MCP server '{self.config.name}' missing required field: url")
                 read, write = await self.exit_stack.enter_async_context(
                     sse_client(
-                        url=self._resolve_string(self.config.url),
-                        headers=self._resolve_dict(self.config.headers) or None,
+                        url=self.config.resolved_url,
+                        headers=self.config.resolved_headers or None,
                         timeout=self.config.timeout,
                         sse_read_timeout=self.config.sse_read_timeout,
+                        **_pooled_client_kwargs(sse_client)
                     )
                 )
             else:
@@ -133,8 +392,13 @@ class MCPConnection:
             # 初始化连接
             await self.session.initialize()
             
-            # 获取服务器能力
-            await self._discover_capabilities()
+            # 获取服务器能力（优先使用未过期的磁盘缓存）
+            if not await asyncio.to_thread(self._load_discovery_cache):
+                if await self._discover_capabilities():
+                    await asyncio.to_thread(self._save_discovery_cache)
+            self._read_only_tools = frozenset(
+                tool["name"] for tool in self._tools if tool.get("readOnly")
+            )
             
             self._connected = True
             logger.info(f"MCP server '{self.config.name}' connected successfully")
@@ -145,47 +409,116 @@ class MCPConnection:
             await self.disconnect()
             return False
 
-    def _resolve_string(self, value: str) -> str:
-        """解析字符串中的环境变量占位符，例如 ${TOKEN}。"""
-        return os.path.expandvars(value)
-
-    def _resolve_dict(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """递归解析字典中的字符串环境变量。"""
-        resolved: Dict[str, Any] = {}
-        for key, value in (data or {}).items():
-            if isinstance(value, str):
-                resolved[key] = self._resolve_string(value)
-            else:
-                resolved[key] = value
-        return resolved
-
-    def _resolve_env(self, env: Dict[str, str]) -> Dict[str, str]:
-        """解析 env 值中的变量引用。"""
-        return {k: self._resolve_string(str(v)) for k, v in (env or {}).items()}
-    
-    async def _discover_capabilities(self):
-        """发现服务器能力"""
+    async def _discover_capabilities(self) -> bool:
+        """发现服务器能力（三类列表请求互不依赖，并发发出），返回工具列表是否获取成功"""
         if not self.session:
-            return
+            return False
         
+        tools_ok, _, _ = await asyncio.gather(
+            self._list_tools(),
+            self._list_resources(),
+            self._list_prompts(),
+            return_exceptions=True
+        )
+        return tools_ok is True
+    
+    def _discovery_cache_path(self) -> str:
+        """缓存文件路径：以服务器身份（命令、参数、环境、URL及可执行文件mtime）的哈希为键"""
+        config = self.config
+        identity = {
+            "transport": config.transport,
+            "command": config.command,
+            "args": config.args,
+            "env": config.env,
+            "url": config.url,
+        }
+        if config.command:
+            # 可执行文件升级后自动失效
+            executable = shutil.which(config.command)
+            if executable:
+                try:
+                    identity["mtime_ns"] = os.stat(executable).st_mtime_ns
+                except OSError:
+                    pass
+        digest = hashlib.blake2b(_dumps(identity)).hexdigest()[:16]
+        return os.path.join(DISCOVERY_CACHE_DIR, f"{digest}.json")
+    
+    def _load_discovery_cache(self) -> bool:
+        """从磁盘缓存加载能力列表，命中且未过期时返回True"""
+        ttl = self.config.discovery_cache_ttl
+        if ttl <= 0:
+            return False
+        try:
+            with open(self._discovery_cache_path(), "rb") as f:
+                cached = _loads(f.read())
+            if time.time() - cached["created"] > ttl:
+                return False
+            tools, resources, prompts = cached["tools"], cached["resources"], cached["prompts"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        self._tools, self._resources, self._prompts = tools, resources, prompts
+        logger.debug(f"Loaded capabilities of '{self.config.name}' from discovery cache")
+        return True
+    
+    def _save_discovery_cache(self) -> None:
+        """写入能力列表磁盘缓存（失败时忽略）"""
+        if self.config.discovery_cache_ttl <= 0:
+            return
+        path = self._discovery_cache_path()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(DISCOVERY_CACHE_DIR, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(_dumps({
+                    "created": time.time(),
+                    "tools": self._tools,
+                    "resources": self._resources,
+                    "prompts": self._prompts,
+                }))
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.debug(f"Failed to write discovery cache: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+    
+    async def _check_unknown_tool(self, message: str) -> None:
+        """服务器报告工具不存在时，说明缓存的工具列表已过期，删除后下次连接重新发现"""
+        if self.config.discovery_cache_ttl > 0 and _is_unknown_tool_error(message):
+            await asyncio.to_thread(self._invalidate_discovery_cache)
+    
+    def _invalidate_discovery_cache(self) -> None:
+        """删除能力列表磁盘缓存（缓存的工具列表已与服务器不一致）"""
+        try:
+            os.remove(self._discovery_cache_path())
+        except OSError:
+            pass
+    
+    async def _list_tools(self) -> bool:
+        """获取工具列表"""
         try:
-            # 获取工具列表
             tools_result = await self.session.list_tools()
             self._tools = [
                 {
                     "name": tool.name,
                     "description": tool.description or "",
-                    "inputSchema": tool.inputSchema or {"type": "object"}
+                    "inputSchema": tool.inputSchema or {"type": "object"},
+                    # MCP工具注解：声明为只读的工具结果可合并与缓存（旧版SDK无此字段）
+                    "readOnly": bool(getattr(getattr(tool, "annotations", None), "readOnlyHint", False))
                 }
                 for tool in tools_result.tools
             ]
             logger.debug(f"Discovered {len(self._tools)} tools")
+            return True
             
         except Exception as e:
             logger.debug(f"Failed to list tools: {e}")
-        
+            return False
+    
+    async def _list_resources(self):
+        """获取资源列表"""
         try:
-            # 获取资源列表
             resources_result = await self.session.list_resources()
             self._resources = [
                 {
@@ -200,9 +533,10 @@ class MCPConnection:
             
         except Exception as e:
             logger.debug(f"Failed to list resources: {e}")
-        
+    
+    async def _list_prompts(self):
+        """获取提示列表"""
         try:
-            # 获取提示列表
             prompts_result = await self.session.list_prompts()
             self._prompts = [
                 {
@@ -225,30 +559,71 @@ class MCPConnection:
             logger.debug(f"Failed to list prompts: {e}")
     
     async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict:
-        """调用工具"""
+        """调用工具（只读工具的相同并发调用合并为一次请求）"""
         if not self.session or not self._connected:
             raise RuntimeError("MCP session not connected")
         
+        key = self._result_key(tool_name, arguments)
+        if key is None:
+            # 非只读工具可能改变服务器状态：调用前后都不再合并此前发出的只读请求
+            self._inflight.clear()
+            try:
+                return await self._call_tool(tool_name, arguments)
+            finally:
+                self._inflight.clear()
+        
+        while True:
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            # 单个等待方被取消不应影响共享的请求；发起方中途退出时结果为None，重新发起
+            response = await asyncio.shield(pending)
+            if response is not None:
+                return response
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            response = await self._call_tool(tool_name, arguments)
+        except BaseException:
+            future.set_result(None)
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        future.set_result(response)
+        return response
+    
+    def _result_key(self, tool_name: str, arguments: Dict[str, Any]) -> Optional[Tuple[str, bytes]]:
+        """只读工具的合并键；非只读或参数无法序列化时返回None"""
+        if tool_name not in self._read_only_tools:
+            return None
         try:
-            result = await self.session.call_tool(tool_name, arguments)
+            return tool_name, _dumps(arguments)
+        except (TypeError, ValueError):
+            return None
+    
+    async def _call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict:
+        """发出单次工具调用请求"""
+        try:
+            async with self._call_sem:
+                result = await self.session.call_tool(tool_name, arguments)
             
-            # 处理结果内容
-            content_text = ""
-            if result.content:
-                for content_item in result.content:
-                    if hasattr(content_item, 'text'):
-                        content_text += content_item.text + "\n"
-                    elif hasattr(content_item, 'data'):
-                        content_text += str(content_item.data) + "\n"
+            if getattr(result, "isError", False):
+                await self._check_unknown_tool(" ".join(
+                    item.text for item in result.content or () if isinstance(item, TextContent)
+                ))
             
+            # 原样返回SDK内容对象，由调用方一次遍历提取文本，避免中间拼接
             return {
                 "result": {
-                    "content": [{"type": "text", "text": content_text.strip()}]
+                    "content": list(result.content or ())
                 }
             }
             
         except Exception as e:
             logger.error(f"Tool call failed: {e}")
+            await self._check_unknown_tool(str(e))
             return {
                 "error": {
                     "message": str(e)
@@ -267,15 +642,47 @@ class MCPConnection:
         """获取提示列表"""
         return self._prompts
     
+    @property
+    def tool_count(self) -> int:
+        """工具数量"""
+        return len(self._tools)
+    
+    @property
+    def resource_count(self) -> int:
+        """资源数量"""
+        return len(self._resources)
+    
+    @property
+    def prompt_count(self) -> int:
+        """提示数量"""
+        return len(self._prompts)
+    
     async def disconnect(self) -> None:
         """断开连接"""
+        self._inflight.clear()
+        self._connected = False
         try:
-            await self.exit_stack.aclose()
-            self._connected = False
+            await _close_exit_stack(self.exit_stack, _DISCONNECT_TIMEOUT)
             logger.debug(f"MCP server '{self.config.name}' disconnected")
-        except BaseException as e:
-            self._connected = False
-            # 某些 MCP 传输在关闭时会抛 CancelledError / cancel scope 等，
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"MCP server '{self.config.name}' did not shut down within {_DISCONNECT_TIMEOUT}s, killing it"
+            )
+            # 放弃的exit stack不会再清理子进程，直接结束，避免遗留孤儿进程
+            if self._process is not None:
+                _kill_process(self._process)
+        except asyncio.CancelledError:
+            # 当前任务确实被取消时必须继续向上传播，外层才能及时退出；
+            # 传输层关闭时泄漏出的取消（任务本身未被取消）则视为正常关闭
+            cancelling = getattr(asyncio.current_task(), "cancelling", None)
+            if cancelling is None or cancelling():
+                logger.debug(f"MCP server '{self.config.name}' disconnect cancelled")
+                if self._process is not None:
+                    _kill_process(self._process)
+                raise
+            logger.debug(f"MCP server '{self.config.name}' disconnected with expected shutdown signal")
+        except Exception as e:
+            # 某些 MCP 传输在关闭时会抛 cancel scope 等错误，
             # 这些属于退出阶段可预期行为，不需要污染终端输出。
             text = str(e).lower()
             expected = (
@@ -289,11 +696,46 @@ class MCPConnection:
                 logger.debug(f"MCP server '{self.config.name}' disconnected with expected shutdown signal: {e}")
             else:
                 logger.warning(f"Error disconnecting MCP server '{self.config.name}': {e}")
+        finally:
+            self._process = None
+
+
+def _generic_content_text(item: Any) -> Optional[str]:
+    """未知类型的内容片段：优先取text，否则取data的字符串形式"""
+    text = getattr(item, 'text', None)
+    if text is None:
+        data = getattr(item, 'data', None)
+        if data is not None:
+            text = str(data)
+    return text
+
+
+# SDK内容类型 -> 文本提取函数（按具体类型分派，省去逐项属性探测）
+_CONTENT_TEXT_HANDLERS = {
+    TextContent: lambda item: item.text,
+    ImageContent: lambda item: str(item.data),
+}
+
+
+def _content_to_text(content: List[Any]) -> str:
+    """将MCP结果内容片段拼接为文本：优先取text，否则取data的字符串形式"""
+    buf = io.StringIO()
+    handlers = _CONTENT_TEXT_HANDLERS
+    for item in content:
+        text = handlers.get(type(item), _generic_content_text)(item)
+        if text is None:
+            continue
+        if buf.tell():
+            buf.write("\n")
+        buf.write(text)
+    return buf.getvalue().strip()
 
 
 class MCPToolInvocation(ToolInvocation):
     """MCP工具调用"""
     
+    __slots__ = ("connection", "mcp_tool_name")
+    
     def __init__(self, *args, connection: MCPConnection, mcp_tool_name: str, **kwargs):
         super().__init__(*args, **kwargs)
         self.connection = connection
@@ -317,12 +759,8 @@ class MCPToolInvocation(ToolInvocation):
             result = response.get("result", {})
             content = result.get("content", [])
             
-            # 提取文本内容
-            text_content = "\n".join([
-                item.get("text", "") 
-                for item in content 
-                if item.get("type") == "text"
-            ])
+            # 提取文本内容（单次遍历写入缓冲区）
+            text_content = _content_to_text(content)
             
             return ToolResult(
                 call_id=self.call_id,
@@ -341,6 +779,8 @@ class MCPToolInvocation(ToolInvocation):
 class MCPAdapter(ToolBuilder):
     """MCP工具适配器"""
     
+    __slots__ = ("server_name", "mcp_tool", "connection")
+    
     def __init__(
         self,
         server_name: str,
@@ -352,14 +792,16 @@ class MCPAdapter(ToolBuilder):
         self.connection = connection
         
         # 构建工具名（添加前缀避免冲突）
-        tool_name = f"mcp__{server_name}__{mcp_tool['name']}"
+        tool_name = _adapter_name(server_name, mcp_tool)
         
         super().__init__(
             name=tool_name,
             display_name=f"[{server_name}] {mcp_tool['name']}",
             description=mcp_tool.get("description", ""),
-            kind=ToolKind.OTHER,
-            parameter_schema=mcp_tool.get("inputSchema", {"type": "object"})
+            # 声明只读（readOnlyHint）的工具按读取类处理，可与相邻读取调用并发执行
+            kind=ToolKind.READ if mcp_tool.get("readOnly") else ToolKind.OTHER,
+            parameter_schema=mcp_tool.get("inputSchema", {"type": "object"}),
+            concurrency_group=f"mcp__{server_name}"
         )
     
     def build(self, call_id: str, params: Dict[str, Any]) -> ToolInvocation:
@@ -374,39 +816,115 @@ class MCPAdapter(ToolBuilder):
         )
 
 
+def _adapter_name(server_name: str, mcp_tool: Dict) -> str:
+    """MCP工具在注册表中的完整名称（与MCPAdapter保持一致）"""
+    return f"mcp__{server_name}__{mcp_tool['name']}"
+
+
+class _AdapterView(Sequence):
+    """适配器的只读序列视图：按需构建被访问到的MCPAdapter"""
+    
+    __slots__ = ("_manager",)
+    
+    def __init__(self, manager: "MCPManager"):
+        self._manager = manager
+    
+    def __len__(self) -> int:
+        return len(self._manager._adapter_specs)
+    
+    def __iter__(self) -> Iterator[MCPAdapter]:
+        get_adapter = self._manager.get_adapter
+        for name in list(self._manager._adapter_specs):
+            yield get_adapter(name)
+    
+    def __getitem__(self, index):
+        names = list(self._manager._adapter_specs)
+        get_adapter = self._manager.get_adapter
+        if isinstance(index, slice):
+            return [get_adapter(name) for name in names[index]]
+        return get_adapter(names[index])
+
+
 class MCPManager:
     """MCP管理器 - 管理多个MCP服务器连接"""
     
     def __init__(self):
         self.connections: Dict[str, MCPConnection] = {}
-        self.adapters: List[MCPAdapter] = []
+        # 完整工具名 -> (服务器名, 工具描述, 连接)；适配器在首次访问时才构建
+        self._adapter_specs: Dict[str, Tuple[str, Dict, MCPConnection]] = {}
+        self._built: Dict[str, MCPAdapter] = {}
+        # 服务器名 -> 该服务器的完整工具名（移除服务器时无需扫描全部工具）
+        self._adapters_by_server: Dict[str, List[str]] = {}
+        # 按服务器名串行化连接过程，避免并发add_server重复启动同一服务器
+        self._locks: Dict[str, asyncio.Lock] = {}
     
     async def add_server(self, config: MCPServerConfig) -> bool:
-        """添加MCP服务器"""
+        """添加MCP服务器（同名服务器已连接时直接复用）"""
+        if config.name in self.connections:
+            return True
+        
+        async with self._locks.setdefault(config.name, asyncio.Lock()):
+            # 等锁期间可能已由其他调用连接完成
+            if config.name in self.connections:
+                return True
+            return await self._connect_server(config)
+    
+    async def _connect_server(self, config: MCPServerConfig) -> bool:
+        """建立连接并注册工具适配器"""
         connection = MCPConnection(config)
         
         if await connection.connect():
             self.connections[config.name] = connection
             
-            # 创建工具适配器
+            # 登记工具适配器（延迟构建）
+            names = []
             for tool in connection.get_tools():
-                adapter = MCPAdapter(config.name, tool, connection)
-                self.adapters.append(adapter)
+                name = _adapter_name(config.name, tool)
+                self._adapter_specs[name] = (config.name, tool, connection)
+                names.append(name)
+            self._adapters_by_server[config.name] = names
             
             logger.info(
                 f"MCP server '{config.name}' added with "
-                f"{len(connection.get_tools())} tools, "
-                f"{len(connection.get_resources())} resources, "
-                f"{len(connection.get_prompts())} prompts"
+                f"{connection.tool_count} tools, "
+                f"{connection.resource_count} resources, "
+                f"{connection.prompt_count} prompts"
             )
             return True
         
         logger.error(f"Failed to connect to MCP server '{config.name}'")
         return False
     
-    def get_adapters(self) -> List[MCPAdapter]:
-        """获取所有MCP工具适配器"""
-        return self.adapters
+    async def add_servers(self, configs: List[MCPServerConfig]) -> List[bool]:
+        """并发添加多个MCP服务器，按传入顺序返回各自是否成功"""
+        results = await asyncio.gather(
+            *(self.add_server(config) for config in configs),
+            return_exceptions=True
+        )
+        return [result is True for result in results]
+    
+    def get_adapter(self, name: str) -> Optional[MCPAdapter]:
+        """按完整工具名获取适配器（首次访问时构建）"""
+        adapter = self._built.get(name)
+        if adapter is None:
+            spec = self._adapter_specs.get(name)
+            if spec is None:
+                return None
+            adapter = self._built[name] = MCPAdapter(*spec)
+        return adapter
+    
+    def get_adapters(self) -> Sequence:
+        """获取所有MCP工具适配器（序列视图，访问到的适配器才会构建）"""
+        return _AdapterView(self)
+    
+    @property
+    def adapters(self) -> Sequence:
+        """所有MCP工具适配器"""
+        return self.get_adapters()
+    
+    def get_tool_names(self) -> List[str]:
+        """获取所有MCP工具的完整名称（不构建适配器）"""
+        return list(self._adapter_specs)
     
     async def remove_server(self, name: str) -> None:
         """移除MCP服务器"""
@@ -415,16 +933,19 @@ class MCPManager:
             del self.connections[name]
             
             # 移除相关适配器
-            self.adapters = [
-                a for a in self.adapters 
-                if not a.name.startswith(f"mcp__{name}__")
-            ]
+            for tool_name in self._adapters_by_server.pop(name, ()):
+                self._adapter_specs.pop(tool_name, None)
+                self._built.pop(tool_name, None)
             logger.info(f"MCP server '{name}' removed")
     
     async def disconnect_all(self) -> None:
-        """断开所有连接"""
-        for name, connection in self.connections.items():
-            await connection.disconnect()
+        """断开所有连接（并发关闭各服务器）"""
+        await asyncio.gather(
+            *(connection.disconnect() for connection in self.connections.values()),
+            return_exceptions=True
+        )
         self.connections.clear()
-        self.adapters.clear()
+        self._adapter_specs.clear()
+        self._built.clear()
+        self._adapters_by_server.clear()
         logger.info("All MCP servers disconnected")
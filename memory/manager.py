@@ -2,9 +2,13 @@
 记忆系统 - 三层记忆架构
 模仿Gemini CLI的记忆系统
 """
+import asyncio
+import io
+import itertools
 import os
 import re
-from typing import Dict, List, Optional, Set
+import weakref
+from typing import Callable, Dict, Iterator, List, Optional, TextIO, Tuple, Union
 from pathlib import Path
 from dataclasses import dataclass, field
 from datetime import datetime
@@ -19,6 +23,10 @@ class MemoryEntry:
     metadata: Dict = field(default_factory=dict)
 
 
+# 全局记忆追加写入时每隔多少条fsync一次
+_GLOBAL_MEMORY_FSYNC_EVERY = 16
+
+
 class MemoryManager:
     """记忆管理器 - 管理三层记忆"""
     
@@ -29,69 +37,130 @@ class MemoryManager:
         
         self._global_memory: str = ""
         self._environment_memory: str = ""
+        # 已加载的上下文文件 -> 内容（读取失败不记录，下次访问时重试）
         self._jit_context: Dict[str, str] = {}
-        self._loaded_paths: Set[str] = set()
+        # JIT上下文拼接结果缓存，_jit_context变化时置脏
+        self._jit_context_joined: str = ""
+        self._jit_dirty = False
+        # 全局记忆追加句柄（首次写入时打开，路径变化时重开）
+        self._global_memory_fh: Optional[TextIO] = None
+        self._global_memory_fh_closer: Optional[weakref.finalize] = None
+        self._global_memory_writes = 0
+        # 内存中的全局记忆与哪个文件同步（追加时据此决定增量更新还是重新读取）
+        self._global_memory_source: Optional[Path] = None
     
     async def refresh(self) -> None:
         """刷新所有记忆"""
-        await self._load_global_memory()
-        await self._load_environment_memory()
+        await asyncio.gather(
+            self._load_global_memory(),
+            self._load_environment_memory()
+        )
+    
+    @staticmethod
+    def _read_if_exists(path: Path) -> Optional[str]:
+        """文件存在时读取内容，否则返回None"""
+        if path.exists():
+            return path.read_text(encoding='utf-8')
+        return None
     
     async def _load_global_memory(self) -> None:
         """加载全局记忆 (Tier 1)"""
-        if self.global_memory_path.exists():
-            try:
-                self._global_memory = self.global_memory_path.read_text(encoding='utf-8')
-            except Exception as e:
-                print(f"Error loading global memory: {e}")
-                self._global_memory = ""
+        path = self.global_memory_path
+        try:
+            content = await asyncio.to_thread(self._read_if_exists, path)
+        except Exception as e:
+            print(f"Error loading global memory: {e}")
+            self._global_memory = ""
+            self._global_memory_source = None
+            return
+        if content is not None:
+            self._global_memory = content
+            self._global_memory_source = path
     
     async def _load_environment_memory(self) -> None:
         """加载环境记忆 (Tier 2)"""
-        if self.environment_memory_path.exists():
-            try:
-                self._environment_memory = self.environment_memory_path.read_text(encoding='utf-8')
-            except Exception as e:
-                print(f"Error loading environment memory: {e}")
-                self._environment_memory = ""
+        try:
+            content = await asyncio.to_thread(self._read_if_exists, self.environment_memory_path)
+        except Exception as e:
+            print(f"Error loading environment memory: {e}")
+            self._environment_memory = ""
+            return
+        if content is not None:
+            self._environment_memory = content
     
     async def discover_context(self, accessed_path: str, trusted_roots: List[str]) -> str:
         """
         动态发现JIT上下文 (Tier 3)
         基于访问路径动态加载子目录特定上下文
+        
+        路径链的遍历与各级文件的检查/读取在同一个工作线程中完成，只切换一次线程。
         """
-        # 简化实现：查找访问路径下的.nano_claw/memory.md
-        path = Path(accessed_path)
+        results = await asyncio.to_thread(
+            self._load_context_chain, accessed_path, trusted_roots, self._jit_context.get
+        )
+        
         context_parts = []
+        for file_key, content in results:
+            if isinstance(content, Exception):
+                print(f"Error loading JIT context from {file_key}: {content}")
+                continue
+            if file_key not in self._jit_context:
+                self._jit_context[file_key] = content
+                self._jit_dirty = True
+            if content:
+                context_parts.append(content)
         
-        # 遍历路径层次，查找上下文文件
-        current = path if path.is_dir() else path.parent
+        return "\n\n".join(reversed(context_parts))
+    
+    @staticmethod
+    def _load_context_chain(
+        accessed_path: str,
+        trusted_roots: List[str],
+        get_cached: Callable[[str], Optional[str]]
+    ) -> List[Tuple[str, Union[str, Exception]]]:
+        """在工作线程中列出候选文件并逐个检查/读取，返回存在的文件 (路径, 内容或读取异常)"""
+        results: List[Tuple[str, Union[str, Exception]]] = []
+        for key in MemoryManager._context_candidates(accessed_path, trusted_roots):
+            try:
+                content = MemoryManager._read_context_file(key, get_cached(key))
+            except Exception as e:
+                results.append((key, e))
+                continue
+            if content is not None:
+                results.append((key, content))
+        return results
+    
+    @staticmethod
+    def _context_candidates(accessed_path: str, trusted_roots: List[str]) -> List[str]:
+        """从访问路径向上到信任根目录，列出各级的.nano_claw/context.md路径（由近及远）"""
+        # 所有信任根一次startswith(tuple)比较；全程使用字符串路径，避免反复构造Path
+        roots = tuple(str(root) for root in trusted_roots)
+        current = str(Path(accessed_path))
+        if not os.path.isdir(current):
+            current = os.path.dirname(current) or "."
+        candidates = []
         
-        while current != current.parent:  # 直到根目录
-            context_file = current / ".nano_claw" / "context.md"
-            
-            if context_file.exists():
-                file_key = str(context_file)
-                
-                if file_key not in self._loaded_paths:
-                    try:
-                        content = context_file.read_text(encoding='utf-8')
-                        self._jit_context[file_key] = content
-                        self._loaded_paths.add(file_key)
-                    except Exception as e:
-                        print(f"Error loading JIT context from {context_file}: {e}")
-                
-                if file_key in self._jit_context:
-                    context_parts.append(self._jit_context[file_key])
+        while True:
+            parent = os.path.dirname(current) or "."
+            if parent == current:  # 直到根目录
+                break
+            candidates.append(os.path.join(current, ".nano_claw", "context.md"))
             
             # 向上遍历
-            current = current.parent
+            current = parent
             
             # 检查是否超出信任根目录
-            if not any(str(current).startswith(root) for root in trusted_roots):
+            if not current.startswith(roots):
                 break
         
-        return "\n\n".join(reversed(context_parts))
+        return candidates
+    
+    @staticmethod
+    def _read_context_file(path: str, cached: Optional[str]) -> Optional[str]:
+        """上下文文件存在时返回内容（已加载过的只检查存在性，不重复读取），否则返回None"""
+        if cached is not None:
+            return cached if os.path.exists(path) else None
+        return MemoryManager._read_if_exists(Path(path))
     
     def get_global_memory(self) -> str:
         """获取全局记忆"""
@@ -102,24 +171,27 @@ class MemoryManager:
         return self._environment_memory
     
     def get_jit_context(self) -> str:
-        """获取JIT上下文"""
-        return "\n\n".join(self._jit_context.values())
+        """获取JIT上下文（内容未变化时复用上次拼接结果）"""
+        if self._jit_dirty:
+            self._jit_context_joined = "\n\n".join(c for c in self._jit_context.values() if c)
+            self._jit_dirty = False
+        return self._jit_context_joined
     
     def get_combined_context(self) -> str:
-        """获取组合后的完整上下文"""
-        parts = []
-        
-        if self._global_memory:
-            parts.append(f"## Global Memory\n{self._global_memory}")
-        
-        if self._environment_memory:
-            parts.append(f"## Project Context (GEMINI.md)\n{self._environment_memory}")
-        
-        jit = self.get_jit_context()
-        if jit:
-            parts.append(f"## Additional Context\n{jit}")
-        
-        return "\n\n".join(parts)
+        """获取组合后的完整上下文（各段直接写入同一缓冲区）"""
+        buf = io.StringIO()
+        for header, body in (
+            ("## Global Memory\n", self._global_memory),
+            ("## Project Context (GEMINI.md)\n", self._environment_memory),
+            ("## Additional Context\n", self.get_jit_context()),
+        ):
+            if not body:
+                continue
+            if buf.tell():
+                buf.write("\n\n")
+            buf.write(header)
+            buf.write(body)
+        return buf.getvalue()
     
     async def add_global_memory(self, category: str, content: str) -> None:
         """添加全局记忆条目"""
@@ -129,9 +201,6 @@ class MemoryManager:
             content=content
         )
         
-        # 确保目录存在
-        self.global_memory_path.parent.mkdir(parents=True, exist_ok=True)
-        
         # 追加到文件
         entry_text = f"""
 ---
@@ -141,11 +210,41 @@ category: {category}
 {content}
 """
         
-        with open(self.global_memory_path, 'a', encoding='utf-8') as f:
-            f.write(entry_text)
+        fh = self._global_memory_handle()
+        fh.write(entry_text)
+        fh.flush()
+        self._global_memory_writes += 1
+        if self._global_memory_writes % _GLOBAL_MEMORY_FSYNC_EVERY == 0:
+            os.fsync(fh.fileno())
         
-        # 刷新
-        await self._load_global_memory()
+        # 内存内容已与该文件同步时直接追加，否则重新读取
+        if self._global_memory_source == self.global_memory_path:
+            self._global_memory += entry_text
+        else:
+            await self._load_global_memory()
+    
+    def _global_memory_handle(self) -> TextIO:
+        """获取全局记忆文件的追加句柄"""
+        path = self.global_memory_path
+        fh = self._global_memory_fh
+        if fh is not None and not fh.closed and fh.name == str(path):
+            return fh
+        
+        self.close()
+        # 确保目录存在
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fh = open(path, 'a', encoding='utf-8')
+        self._global_memory_fh = fh
+        # 管理器被回收或进程退出时自动关闭
+        self._global_memory_fh_closer = weakref.finalize(self, fh.close)
+        return fh
+    
+    def close(self) -> None:
+        """关闭全局记忆的追加句柄"""
+        if self._global_memory_fh_closer is not None:
+            self._global_memory_fh_closer()
+        self._global_memory_fh = None
+        self._global_memory_fh_closer = None
     
     def format_for_system_prompt(self) -> str:
         """格式化为系统提示词的一部分"""
@@ -160,42 +259,79 @@ category: {category}
 **Note:** Use the above context to inform your responses and decisions."""
 
 
+# 提取项目结构时跳过的目录（隐藏目录另行跳过）
+_SKIP_DIRS = frozenset({'node_modules', '__pycache__', 'venv'})
+
+
+# 标志文件名 -> 技术栈
+_FILE_TO_TECH = {
+    "requirements.txt": "python",
+    "setup.py": "python",
+    "pyproject.toml": "python",
+    "Pipfile": "python",
+    "package.json": "javascript",
+    "package-lock.json": "javascript",
+    "yarn.lock": "javascript",
+    "tsconfig.json": "typescript",
+    "Cargo.toml": "rust",
+    "go.mod": "go",
+    "Dockerfile": "docker",
+    "docker-compose.yml": "docker",
+}
+
+
 class ProjectContextExtractor:
     """项目上下文提取器"""
     
     def __init__(self, project_root: str = "."):
         self.project_root = Path(project_root)
     
-    def extract_structure(self, max_depth: int = 3) -> str:
-        """提取项目结构"""
-        lines = ["Project Structure:"]
+    def extract_structure(self, max_depth: int = 3, max_lines: Optional[int] = None) -> str:
+        """提取项目结构（max_lines限制输出行数，超出部分不再遍历）"""
+        lines = self.iter_structure(max_depth)
+        if max_lines is not None:
+            lines = itertools.islice(lines, max_lines)
+        return "\n".join(lines)
+    
+    def iter_structure(self, max_depth: int = 3) -> Iterator[str]:
+        """逐行生成项目结构（基于scandir的迭代深度优先遍历，输出顺序与os.walk一致）"""
+        yield "Project Structure:"
+        root_name = os.path.basename(self.project_root) or "."
+        stack = [(str(self.project_root), "", 0)]
         
-        for root, dirs, files in os.walk(self.project_root):
-            depth = root.count(os.sep) - str(self.project_root).count(os.sep)
-            
-            if depth > max_depth:
-                del dirs[:]
+        while stack:
+            current, rel_path, depth = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    entries = list(it)
+            except OSError:
                 continue
             
-            # 跳过隐藏目录和常见忽略目录
-            dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['node_modules', '__pycache__', 'venv']]
+            # 目录项自带类型信息，无需逐个stat；符号链接目录不展开（同os.walk默认行为）
+            subdirs = [
+                e for e in entries
+                if e.is_dir(follow_symlinks=False)
+                and not e.name.startswith('.') and e.name not in _SKIP_DIRS
+            ]
+            files = [e.name for e in entries if not e.is_dir()]
             
             indent = "  " * depth
-            rel_path = os.path.relpath(root, self.project_root)
-            if rel_path == '.':
-                rel_path = os.path.basename(self.project_root) or "."
-            
-            lines.append(f"{indent}{rel_path}/")
+            yield f"{indent}{rel_path or root_name}/"
             
             # 显示文件（限制数量）
             shown_files = [f for f in files if not f.startswith('.')][:5]
             for f in shown_files:
-                lines.append(f"{indent}  {f}")
+                yield f"{indent}  {f}"
             
             if len(files) > 5:
-                lines.append(f"{indent}  ... and {len(files) - 5} more files")
-        
-        return "\n".join(lines)
+                yield f"{indent}  ... and {len(files) - 5} more files"
+            
+            if depth < max_depth:
+                # 逆序入栈，保证按目录项原顺序出栈
+                stack.extend(
+                    (e.path, os.path.join(rel_path, e.name), depth + 1)
+                    for e in reversed(subdirs)
+                )
     
     def find_gemini_md(self) -> Optional[str]:
         """查找GEMINI.md文件"""
@@ -205,22 +341,13 @@ class ProjectContextExtractor:
         return None
     
     def extract_tech_stack(self) -> Dict[str, List[str]]:
-        """提取技术栈信息"""
-        indicators = {
-            "python": ["requirements.txt", "setup.py", "pyproject.toml", "Pipfile"],
-            "javascript": ["package.json", "package-lock.json", "yarn.lock"],
-            "typescript": ["tsconfig.json"],
-            "rust": ["Cargo.toml"],
-            "go": ["go.mod"],
-            "docker": ["Dockerfile", "docker-compose.yml"],
-        }
-        
-        detected = {k: [] for k in indicators.keys()}
+        """提取技术栈信息（单次遍历根目录，按文件名查表）"""
+        detected: Dict[str, List[str]] = {}
         
-        for item in self.project_root.iterdir():
-            if item.is_file():
-                for tech, files in indicators.items():
-                    if item.name in files:
-                        detected[tech].append(item.name)
+        with os.scandir(self.project_root) as it:
+            for entry in it:
+                tech = _FILE_TO_TECH.get(entry.name)
+                if tech and entry.is_file():
+                    detected.setdefault(tech, []).append(entry.name)
         
-        return {k: v for k, v in detected.items() if v}
\ No newline at end of file
+        return detected
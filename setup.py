@@ -1,6 +1,7 @@
 """
 Nano Agent - A lightweight AI agent framework
 """
+import os
 from setuptools import setup, find_packages
 from pathlib import Path
 
@@ -8,6 +9,24 @@ from pathlib import Path
 this_directory = Path(__file__).parent
 long_description = (this_directory / "README.md").read_text(encoding='utf-8')
 
+# 可选：设置 NANO_CLAW_MYPYC=1 时用mypyc将策略检查热路径编译为C扩展
+# （需安装mypy；编译产物与同名.py并存时优先导入，未编译时使用纯Python实现）
+ext_modules = []
+if os.environ.get("NANO_CLAW_MYPYC") == "1":
+    try:
+        from mypyc.build import mypycify
+    except ImportError:
+        print("NANO_CLAW_MYPYC=1 but mypyc is not installed; building pure Python")
+    else:
+        # 仓库根目录带__init__.py，需以当前目录为包根解析模块名（core.policy）；
+        # 只编译这两个模块，其依赖按解释执行处理，不检查其类型错误
+        ext_modules = mypycify([
+            "--explicit-package-bases",
+            "--follow-imports=silent",
+            "core/policy.py",
+            "core/smart_policy.py",
+        ])
+
 setup(
     name="nano-claw",
     version="0.1.0",
@@ -18,6 +37,7 @@ setup(
     long_description_content_type="text/markdown",
     url="https://github.com/KylinMountain/nano-claw",
     packages=find_packages(exclude=["tests", "examples", "docs"]),
+    ext_modules=ext_modules,
     classifiers=[
         "Development Status :: 3 - Alpha",
         "Intended Audience :: Developers",
@@ -34,6 +54,7 @@ setup(
     python_requires=">=3.8",
     install_requires=[
         "openai>=1.0.0",
+        "httpx>=0.23.0",
         "anthropic>=0.18.0",
         "google-generativeai>=0.3.0",
         "pydantic>=2.0.0",
@@ -58,6 +79,11 @@ setup(
             "flake8>=6.0.0",
             "mypy>=1.0.0",
         ],
+        "speed": [
+            "uvloop>=0.17.0; sys_platform != 'win32'",
+            "orjson>=3.8.0",
+            "tiktoken>=0.5.0",
+        ],
     },
     entry_points={
         "console_scripts": [
@@ -2,9 +2,11 @@
 Skills系统 - 渐进式披露设计
 模仿Gemini CLI的Skills架构
 """
+import copy
+import io
 import os
-import re
-from typing import Dict, List, Optional
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 import yaml
 
@@ -12,8 +14,31 @@ from core.types import SkillDefinition, ConfirmationDetails
 from tools.base import ToolBuilder, ToolInvocation, ToolKind, ToolResult
 
 
-# Frontmatter正则表达式
-FRONTMATTER_REGEX = re.compile(r'^---\s*\n(.*?)\n---\s*\n?(.*)$', re.DOTALL)
+# 优先使用LibYAML的C实现（PyYAML编译时带libyaml才可用）
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+# 已解析的Skill文件：路径 -> ((文件mtime_ns, 文件大小, 所在目录mtime_ns), SkillDefinition)
+# 文件及其目录均未变化时免读取、解析与目录枚举
+_SKILL_CACHE: "OrderedDict[str, Tuple[Tuple[int, int, int], SkillDefinition]]" = OrderedDict()
+_SKILL_CACHE_MAX = 512
+
+# XML文本/属性转义表（单次C级遍历完成替换）
+_XML_ESCAPE_TABLE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"})
+
+# Skills提示词的固定头尾
+_SKILLS_PROMPT_HEADER = """## Available Agent Skills
+
+You have access to the following specialized skills. To activate a skill and receive its detailed instructions, call the `activate_skill` tool with the skill's name.
+
+<available_skills>
+"""
+_SKILLS_PROMPT_FOOTER = """
+</available_skills>
+
+**Skill Guidance:** Once a skill is activated, its instructions and resources are returned wrapped in `<activated_skill>` tags. You MUST treat the content within `<instructions>` as expert procedural guidance, prioritizing these specialized rules and workflows over your general defaults for the duration of the task."""
 
 
 class SkillLoader:
@@ -21,22 +46,38 @@ class SkillLoader:
     
     @staticmethod
     def parse_frontmatter(content: str) -> Optional[tuple]:
-        """解析YAML Frontmatter"""
-        match = FRONTMATTER_REGEX.match(content)
-        if not match:
+        """解析YAML Frontmatter（首行为---，至下一个以---开头的行结束）"""
+        if not content.startswith("---"):
+            return None
+        
+        # 起始分隔行只允许---加空白
+        start = content.find("\n", 3)
+        if start < 0 or content[3:start].strip():
+            return None
+        end = content.find("\n---", start + 1)
+        if end < 0:
             return None
         
         try:
-            frontmatter = yaml.safe_load(match.group(1))
-            body = match.group(2).strip()
+            frontmatter = yaml.load(content[start + 1:end], Loader=_YamlLoader)
+            body = content[end + 4:].strip()
             return frontmatter, body
         except yaml.YAMLError:
             return None
     
     @classmethod
     def load_from_file(cls, file_path: str) -> Optional[SkillDefinition]:
-        """从文件加载Skill"""
+        """从文件加载Skill（文件与所在目录未变时复用上次解析结果）"""
         try:
+            skill_dir = os.path.dirname(file_path) or "."
+            st = os.stat(file_path)
+            signature = (st.st_mtime_ns, st.st_size, os.stat(skill_dir).st_mtime_ns)
+            cached = _SKILL_CACHE.get(file_path)
+            if cached is not None and cached[0] == signature:
+                _SKILL_CACHE.move_to_end(file_path)
+                # 返回副本：调用方会修改is_builtin/active等字段
+                return copy.copy(cached[1])
+            
             with open(file_path, 'r', encoding='utf-8') as f:
                 content = f.read()
             
@@ -46,7 +87,7 @@ class SkillLoader:
             
             frontmatter, body = parsed
             
-            return SkillDefinition(
+            skill = SkillDefinition(
                 name=frontmatter.get('name', ''),
                 description=frontmatter.get('description', ''),
                 location=file_path,
@@ -54,6 +95,13 @@ class SkillLoader:
                 disabled=frontmatter.get('disabled', False),
                 is_builtin=frontmatter.get('is_builtin', False)
             )
+            # 同目录下的资源（目录内容增删会改变目录mtime，使缓存失效）
+            with os.scandir(skill_dir) as it:
+                skill.resources = tuple(e.name for e in it if e.name != 'SKILL.md')
+            _SKILL_CACHE[file_path] = (signature, skill)
+            if len(_SKILL_CACHE) > _SKILL_CACHE_MAX:
+                _SKILL_CACHE.popitem(last=False)
+            return copy.copy(skill)
         except Exception as e:
             print(f"Error loading skill from {file_path}: {e}")
             return None
@@ -88,6 +136,8 @@ class SkillManager:
         self._builtin_dir: Optional[str] = None
         self._user_dir: Optional[str] = None
         self._workspace_dir: Optional[str] = None
+        # generate_skills_prompt的结果缓存，Skills集合或状态变化时清空
+        self._skills_prompt_cache: Optional[str] = None
     
     def set_directories(
         self,
@@ -103,6 +153,7 @@ class SkillManager:
     def discover_skills(self) -> None:
         """发现所有Skills（按优先级合并）"""
         self._skills.clear()
+        self._skills_prompt_cache = None
         
         # 1. 加载内置Skills（最低优先级）
         if self._builtin_dir:
@@ -136,6 +187,7 @@ class SkillManager:
             print(f"Warning: Skill conflict detected: '{skill.name}' from '{skill.location}' overrides '{existing.location}'")
         
         self._skills[skill.name] = skill
+        self._skills_prompt_cache = None
     
     def get_skill(self, name: str) -> Optional[SkillDefinition]:
         """获取Skill"""
@@ -159,6 +211,7 @@ class SkillManager:
         if skill and not skill.disabled:
             self._active_skills.add(name)
             skill.active = True
+            self._skills_prompt_cache = None
             return True
         return False
     
@@ -167,6 +220,7 @@ class SkillManager:
         self._active_skills.discard(name)
         if name in self._skills:
             self._skills[name].active = False
+        self._skills_prompt_cache = None
     
     def is_skill_active(self, name: str) -> bool:
         """检查Skill是否激活"""
@@ -177,30 +231,32 @@ class SkillManager:
         return [self._skills[name] for name in self._active_skills if name in self._skills]
     
     def generate_skills_prompt(self) -> str:
-        """生成Skills提示词（仅Metadata，渐进式披露Level 1）"""
+        """生成Skills提示词（仅Metadata，渐进式披露Level 1；Skills未变化时复用上次结果）"""
+        if self._skills_prompt_cache is not None:
+            return self._skills_prompt_cache
+        
         skills = self.get_available_skills()
         
         if not skills:
+            self._skills_prompt_cache = ""
             return ""
         
-        skill_xml = '\n'.join([
-            f"""  <skill>
-    <name>{s.name}</name>
-    <description>{s.description}</description>
-    <location>{s.location}</location>
-  </skill>"""
-            for s in skills
-        ])
+        buf = io.StringIO()
+        buf.write(_SKILLS_PROMPT_HEADER)
+        for i, s in enumerate(skills):
+            if i:
+                buf.write("\n")
+            buf.write("  <skill>\n    <name>")
+            buf.write(s.name.translate(_XML_ESCAPE_TABLE))
+            buf.write("</name>\n    <description>")
+            buf.write(s.description.translate(_XML_ESCAPE_TABLE))
+            buf.write("</description>\n    <location>")
+            buf.write(s.location.translate(_XML_ESCAPE_TABLE))
+            buf.write("</location>\n  </skill>")
+        buf.write(_SKILLS_PROMPT_FOOTER)
         
-        return f"""## Available Agent Skills
-
-You have access to the following specialized skills. To activate a skill and receive its detailed instructions, call the `activate_skill` tool with the skill's name.
-
-<available_skills>
-{skill_xml}
-</available_skills>
-
-**Skill Guidance:** Once a skill is activated, its instructions and resources are returned wrapped in `<activated_skill>` tags. You MUST treat the content within `<instructions>` as expert procedural guidance, prioritizing these specialized rules and workflows over your general defaults for the duration of the task."""
+        self._skills_prompt_cache = buf.getvalue()
+        return self._skills_prompt_cache
     
     def get_activated_skill_content(self, name: str) -> Optional[str]:
         """获取已激活Skill的完整内容（渐进式披露Level 2）"""
@@ -208,26 +264,29 @@ You have access to the following specialized skills. To activate a skill and rec
         if not skill or not skill.active:
             return None
         
-        # 获取技能目录下的资源
-        skill_dir = os.path.dirname(skill.location)
-        resources = []
+        # 获取技能目录下的资源（优先使用加载时的快照）
+        resources = skill.resources
+        if resources is None:
+            skill_dir = os.path.dirname(skill.location)
+            resources = []
+            if os.path.exists(skill_dir):
+                for item in os.listdir(skill_dir):
+                    if item != 'SKILL.md':
+                        resources.append(item)
         
-        if os.path.exists(skill_dir):
-            for item in os.listdir(skill_dir):
-                if item != 'SKILL.md':
-                    resources.append(item)
-        
-        resources_xml = '\n    '.join([f"<item>{r}</item>" for r in resources])
-        
-        return f"""<activated_skill name="{name}">
-  <instructions>
-{skill.body}
-  </instructions>
-
-  <available_resources>
-    {resources_xml}
-  </available_resources>
-</activated_skill>"""
+        # 先收集全部片段再一次join：str.join预先计算总长度，只分配一次结果字符串
+        # 指令正文是给模型阅读的Markdown，保持原样不转义
+        chunks = [
+            '<activated_skill name="', name.translate(_XML_ESCAPE_TABLE), '">\n  <instructions>\n',
+            skill.body,
+            '\n  </instructions>\n\n  <available_resources>\n    ',
+        ]
+        for i, r in enumerate(resources):
+            chunks.append('\n    <item>' if i else '<item>')
+            chunks.append(r.translate(_XML_ESCAPE_TABLE))
+            chunks.append('</item>')
+        chunks.append('\n  </available_resources>\n</activated_skill>')
+        return "".join(chunks)
 
 
 class ActivateSkillInvocation(ToolInvocation):
@@ -4,7 +4,16 @@
 """
 import asyncio
 import logging
-from mcp_client.client import MCPManager, MCPServerConfig
+import os
+import sys
+import textwrap
+from types import SimpleNamespace
+
+from mcp_client import client as mcp_client_module
+from mcp_client.client import MCPAdapter, MCPConnection, MCPManager, MCPServerConfig
+from core.agent_loop import AgentLoop
+from core.types import ToolCallRequest
+from tools.base import ToolKind
 
 # 设置日志
 logging.basicConfig(level=logging.INFO)
@@ -58,5 +67,165 @@ async def test_mcp():
         logger.info("MCP 连接已清理")
 
 
+
+class _FakeSession:
+    """记录调用的假会话：工具名以 fail_ 开头时抛出“工具不存在”错误"""
+    
+    def __init__(self):
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+    
+    async def call_tool(self, name, arguments):
+        self.calls.append(name)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        if name.startswith("fail_"):
+            raise RuntimeError(f"Unknown tool: {name}")
+        return SimpleNamespace(content=[], isError=False)
+
+
+def _fake_connection(**config) -> MCPConnection:
+    conn = MCPConnection(MCPServerConfig(name="fake", command="fake-server", **config))
+    conn.session = _FakeSession()
+    conn._connected = True
+    return conn
+
+
+class TestMCPDiscoveryCache:
+    """测试能力发现磁盘缓存"""
+    
+    def test_disabled_by_default(self):
+        config = MCPServerConfig.from_dict("fake", {"command": "fake-server"})
+        assert config.discovery_cache_ttl == 0
+    
+    async def test_unknown_tool_invalidates_cache(self, tmp_path, monkeypatch):
+        """调用报告工具不存在时删除缓存文件"""
+        monkeypatch.setattr(mcp_client_module, "DISCOVERY_CACHE_DIR", str(tmp_path))
+        conn = _fake_connection(discovery_cache_ttl=3600)
+        conn._tools = [{"name": "fail_removed", "description": "", "inputSchema": {}}]
+        conn._save_discovery_cache()
+        cache_path = conn._discovery_cache_path()
+        assert os.path.exists(cache_path)
+        
+        response = await conn.call_tool("fail_removed", {})
+        assert "error" in response
+        assert not os.path.exists(cache_path)
+
+
+
+class TestMCPReadCoalescing:
+    """测试只读工具调用的合并与失效"""
+    
+    def setup_method(self):
+        self.conn = _fake_connection()
+        self.conn._read_only_tools = frozenset({"read"})
+        self.calls = self.conn.session.calls
+    
+    async def test_concurrent_reads_coalesced(self):
+        """相同参数的并发只读调用只发出一次请求；完成后的调用不复用旧结果"""
+        results = await asyncio.gather(*(self.conn.call_tool("read", {"q": 1}) for _ in range(3)))
+        assert all("result" in r for r in results)
+        assert self.calls == ["read"]
+        await self.conn.call_tool("read", {"q": 1})
+        assert self.calls == ["read", "read"]
+    
+    async def test_write_stops_coalescing(self):
+        """非只读调用发出后的只读调用不合并到此前进行中的请求"""
+        before = asyncio.create_task(self.conn.call_tool("read", {"q": 1}))
+        await asyncio.sleep(0)
+        write = asyncio.create_task(self.conn.call_tool("write", {"q": 1}))
+        await asyncio.sleep(0)
+        await self.conn.call_tool("read", {"q": 1})
+        await asyncio.gather(before, write)
+        assert self.calls == ["read", "write", "read"]
+    
+    async def test_waiter_retries_when_leader_cancelled(self):
+        """发起请求的调用方被取消时，等待方重新发起而不是随之取消"""
+        leader = asyncio.create_task(self.conn.call_tool("read", {"q": 1}))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(self.conn.call_tool("read", {"q": 1}))
+        await asyncio.sleep(0)
+        leader.cancel()
+        
+        assert "result" in await waiter
+        assert leader.cancelled()
+        assert self.calls == ["read", "read"]
+
+
+
+class TestMCPAdapterScheduling:
+    """测试Agent对MCP工具调用的调度"""
+    
+    async def test_read_only_tools_run_concurrently(self):
+        """只读MCP工具按读取类处理，同批调用并发执行"""
+        conn = _fake_connection()
+        read_tool = {"name": "read", "description": "", "inputSchema": {}, "readOnly": True}
+        write_tool = {"name": "write", "description": "", "inputSchema": {}}
+        conn._read_only_tools = frozenset({"read"})
+        assert MCPAdapter("fake", read_tool, conn).kind == ToolKind.READ
+        assert MCPAdapter("fake", write_tool, conn).kind == ToolKind.OTHER
+        
+        loop = AgentLoop(None)
+        loop.tool_registry.register(MCPAdapter("fake", read_tool, conn))
+        results = await loop._execute_tool_calls([
+            ToolCallRequest(str(i), "mcp__fake__read", {"q": i}) for i in range(3)
+        ])
+        assert all(r.success for r in results)
+        assert conn.session.max_active == 3
+
+
+# 忽略SIGTERM的stdio MCP服务器，模拟关闭时卡住的子进程
+_STUBBORN_SERVER = textwrap.dedent("""
+    import signal
+    from mcp.server.fastmcp import FastMCP
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    FastMCP("stubborn").run()
+""")
+
+
+def _process_exited(pid: int) -> bool:
+    """子进程是否已结束（回收僵尸进程）"""
+    try:
+        reaped, _ = os.waitpid(pid, os.WNOHANG)
+    except ChildProcessError:
+        return True
+    return reaped == pid
+
+
+class TestMCPDisconnect:
+    """测试MCP断开连接"""
+    
+    async def test_timeout_kills_stdio_child(self, tmp_path, monkeypatch):
+        """关闭超时时强制结束stdio子进程，进程创建钩子只在连接期间生效"""
+        script = tmp_path / "server.py"
+        script.write_text(_STUBBORN_SERVER)
+        conn = MCPConnection(MCPServerConfig(
+            name="stubborn",
+            command=sys.executable,
+            args=[str(script)],
+            env={"PYTHONPATH": os.pathsep.join(sys.path)},
+        ))
+        sdk_create = mcp_client_module._mcp_stdio._create_platform_compatible_process
+        
+        assert await conn.connect()
+        assert mcp_client_module._mcp_stdio._create_platform_compatible_process is sdk_create
+        pid = conn._process.pid
+        
+        async def timeout(exit_stack, timeout):
+            raise asyncio.TimeoutError
+        
+        monkeypatch.setattr(mcp_client_module, "_close_exit_stack", timeout)
+        await conn.disconnect()
+        
+        for _ in range(100):
+            if _process_exited(pid):
+                break
+            await asyncio.sleep(0.02)
+        assert _process_exited(pid)
+
+
 if __name__ == "__main__":
     asyncio.run(test_mcp())
@@ -29,6 +29,12 @@ class ToolKind(str, Enum):
 # 有副作用的工具类型
 MUTATOR_KINDS = {ToolKind.EDIT, ToolKind.DELETE, ToolKind.MOVE, ToolKind.EXECUTE}
 
+# 结果可缓存的工具类型（纯读取，相同参数返回相同结果）
+CACHEABLE_KINDS = {ToolKind.READ, ToolKind.SEARCH}
+
+# 可与相邻同类调用并发执行的幂等工具类型（其余类型按请求顺序逐个执行）
+PARALLEL_SAFE_KINDS = {ToolKind.READ, ToolKind.SEARCH, ToolKind.FETCH}
+
 
 class ToolResult:
     """工具执行结果"""
@@ -62,6 +68,12 @@ class ToolResult:
 class ToolBuilder(ABC):
     """工具构建器基类"""
     
+    # 基类字段使用槽位；未声明 __slots__ 的子类仍可自由添加属性
+    __slots__ = (
+        "name", "display_name", "description", "kind", "parameter_schema",
+        "confirmation_required", "confirmation_prompt", "concurrency_group",
+    )
+    
     def __init__(
         self,
         name: str,
@@ -70,7 +82,8 @@ class ToolBuilder(ABC):
         kind: ToolKind = ToolKind.OTHER,
         parameter_schema: Dict = None,
         confirmation_required: bool = False,
-        confirmation_prompt: str = None
+        confirmation_prompt: str = None,
+        concurrency_group: Optional[str] = None
     ):
         self.name = name
         self.display_name = display_name or name
@@ -79,6 +92,8 @@ class ToolBuilder(ABC):
         self.parameter_schema = parameter_schema or {"type": "object", "properties": {}}
         self.confirmation_required = confirmation_required
         self.confirmation_prompt = confirmation_prompt
+        # 共享同一外部资源（如同一MCP服务器）的工具归为一组，组内并发单独限流
+        self.concurrency_group = concurrency_group
     
     @abstractmethod
     def build(self, call_id: str, params: Dict[str, Any]):
@@ -101,6 +116,8 @@ class ToolBuilder(ABC):
 class ToolInvocation:
     """工具调用实例"""
     
+    __slots__ = ("name", "display_name", "kind", "params", "call_id")
+    
     def __init__(
         self,
         name: str,
@@ -130,14 +147,29 @@ class ToolRegistry:
     def __init__(self):
         self._tools: Dict[str, ToolBuilder] = {}
         self._call_id_counter = 0
+        self._schemas_cache: Optional[List] = None
     
     def register(self, tool: ToolBuilder) -> None:
         """注册工具"""
         self._tools[tool.name] = tool
+        self._schemas_cache = None
     
     def unregister(self, name: str) -> None:
         """注销工具"""
         self._tools.pop(name, None)
+        self._schemas_cache = None
+    
+    def clone(self) -> "ToolRegistry":
+        """
+        浅拷贝注册表：共享工具实例与已生成的Schema列表
+        
+        工具构建器本身无状态，可在多个注册表间共享；克隆后的注册/注销
+        只影响克隆体。
+        """
+        registry = ToolRegistry()
+        registry._tools = dict(self._tools)
+        registry._schemas_cache = self._schemas_cache
+        return registry
     
     def get(self, name: str) -> Optional[ToolBuilder]:
         """获取工具"""
@@ -159,7 +191,10 @@ class ToolRegistry:
         return tool.build(call_id, params or {})
     
     def get_all_schemas(self) -> List:
-        """获取所有工具的Schema"""
+        """获取所有工具的Schema（注册表变化前复用同一列表）"""
+        if self._schemas_cache is not None:
+            return self._schemas_cache
+        
         from core.types import ToolSchema
         schemas = []
         for tool in self._tools.values():
@@ -169,6 +204,7 @@ class ToolRegistry:
                 parameters=tool.parameter_schema
             )
             schemas.append(schema)
+        self._schemas_cache = schemas
         return schemas
     
     def create_invocation(self, call_id: str, name: str, params: Dict[str, Any]):
@@ -9,7 +9,7 @@ from typing import Any, Dict, List
 import asyncio
 
 from .base import ToolBuilder, ToolInvocation, ToolKind
-from .base import ToolResult
+from .base import ToolRegistry, ToolResult
 
 
 class ReadFileInvocation(ToolInvocation):
@@ -467,3 +467,21 @@ def register_builtin_tools(registry):
         register_advanced_tools(registry)
     except ImportError as e:
         print(f"Warning: Could not load advanced tools: {e}")
+
+
+_shared_registry = None
+
+
+def get_shared_registry():
+    """
+    获取进程内共享的内置工具注册表（首次调用时构建）
+    
+    使用方应通过 clone() 获取独立副本，不要直接修改共享注册表。
+    """
+    global _shared_registry
+    if _shared_registry is None:
+        registry = ToolRegistry()
+        register_builtin_tools(registry)
+        registry.get_all_schemas()  # 预先生成Schema，克隆体直接复用
+        _shared_registry = registry
+    return _shared_registry